@@ -0,0 +1,33 @@
+import glob
+import os
+import shutil
+import sys
+
+import pytest
+
+os.environ.setdefault("MPLBACKEND", "Agg")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "versions"))
+
+import ver12  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # ver12 keeps its archive in ./stats, so every test gets a directory of its own
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(ver12.STATS_FOLDER)
+    ver12.resolve_passage.cache_clear()
+    yield tmp_path
+    ver12.resolve_passage.cache_clear()
+
+
+@pytest.fixture
+def mixed_archive(workdir):
+    # The session files of every signed layout, plus the passage table schema 2 files name
+    for layout in ("ver10", "ver11", "ver12_schema1", "ver12_schema2"):
+        for path in glob.glob(os.path.join(FIXTURES, layout, "stats2*.txt")):
+            shutil.copy(path, ver12.STATS_FOLDER)
+    shutil.copytree(os.path.join(FIXTURES, "ver12_schema2", "passages"), ver12.PASSAGES_FOLDER)
+    return workdir
@@ -0,0 +1,87 @@
+"""
+The session hash chain: tail-only refreshes and what they still catch.
+"""
+import datetime
+import os
+
+import pytest
+
+import ver12
+
+
+class Clock(datetime.datetime):
+    now_value = datetime.datetime(2025, 1, 1, 9, 0, 0)
+
+    @classmethod
+    def now(cls, tz=None):
+        cls.now_value += datetime.timedelta(days=1)
+        return cls.now_value
+
+
+@pytest.fixture
+def archive(workdir, monkeypatch):
+    # Twelve sessions, one a day from 2025-01-02, every fourth one a cheat file
+    monkeypatch.setattr(ver12.datetime, "datetime", Clock)
+    monkeypatch.setattr(Clock, "now_value", Clock.now_value)
+    sentence = "The quick brown fox jumps over the lazy dog."
+    for i in range(12):
+        ver12.save_score(60.0 + i, 98.0, [0.12 + 0.01 * (i % 3)] * len(sentence), sentence, i % 4 == 3, elapsed=6.0)
+    return sorted(os.listdir(ver12.STATS_FOLDER))
+
+
+def session(day):
+    return os.path.join(ver12.STATS_FOLDER, f"stats202501{day:02d}_090000.txt")
+
+
+def holds():
+    segments, loose = ver12.archive_listing()
+    return ver12.checkpoint_still_holds(ver12.load_chain_checkpoint(), segments, loose, ver12.load_merkle_frontier())
+
+
+def test_saves_refresh_the_tail_only(archive):
+    assert holds()
+    assert ver12.rebuild_cumulative_stats() == []
+    assert ver12.rebuild_cumulative_stats(full=True) == []
+    with open(os.path.join(ver12.STATS_FOLDER, "stats.txt"), "r", encoding='utf-8') as f:
+        assert len(f.read().splitlines()) == 9
+
+
+def test_swapped_sessions_break_the_chain(archive):
+    os.rename(session(3), session(3) + ".swap")
+    os.rename(session(4), session(3))
+    os.rename(session(3) + ".swap", session(4))
+    assert not holds()
+    assert ver12.rebuild_cumulative_stats() == ver12.rebuild_cumulative_stats(full=True) != []
+
+
+def test_deleted_session_breaks_the_chain(archive):
+    os.remove(session(6))
+    assert not holds()
+    assert "stats20250107_090000.txt" in ver12.rebuild_cumulative_stats()
+
+
+def test_session_replaced_by_an_unknown_one(archive):
+    # Same count, but a file the index never saw in place of one it did
+    os.remove(session(5))
+    with open(session(5)[:-len("090000.txt")] + "100000.txt", "w", encoding='utf-8') as f:
+        f.write("CHEAT DETECTED\n")
+    assert not holds()
+    assert ver12.rebuild_cumulative_stats() != []
+
+
+def test_compaction_keeps_the_checkpoint(archive):
+    assert ver12.compact_archive(days=0, max_sessions=5) == 12
+    assert holds()
+    assert ver12.rebuild_cumulative_stats() == []
+
+
+def test_merkle_extends(workdir):
+    frontier = ver12.load_merkle_frontier()
+    for i in range(7):
+        ver12.merkle_append(frontier, f"stats2026{i:06d}.txt", ver12.merkle_leaf(str(i), b"session"))
+    earlier = dict(frontier, peaks=list(frontier["peaks"]))
+    for i in range(7, 10):
+        ver12.merkle_append(frontier, f"stats2026{i:06d}.txt", ver12.merkle_leaf(str(i), b"session"))
+    assert ver12.merkle_extends(earlier, frontier)
+    ver12.merkle_append(frontier, "stats2026000003.txt", ver12.merkle_leaf("3", b"inserted"))
+    assert not ver12.merkle_extends(earlier, frontier)
@@ -0,0 +1,68 @@
+"""
+The varint codec of the Intervals payload, one session or a batch at a time.
+"""
+import random
+
+import numpy as np
+import pytest
+
+import ver12
+
+
+def human_intervals(seed, length=60):
+    rng = random.Random(seed)
+    return np.array([0.5] + [rng.lognormvariate(-2.0, 0.5) for _ in range(length - 1)])
+
+
+def test_varints_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 16383, 16384, 2 ** 32, 2 ** 63 - 1, 2 ** 64 - 1], dtype=np.uint64)
+    encoded = ver12.encode_varints(values)
+    assert np.array_equal(ver12.decode_varints(encoded), values)
+    assert len(ver12.encode_varints(np.array([127], dtype=np.uint64))) == 1
+    assert len(ver12.encode_varints(np.array([128], dtype=np.uint64))) == 2
+
+
+def test_varints_empty():
+    assert ver12.encode_varints(np.zeros(0, dtype=np.uint64)) == b""
+    assert len(ver12.decode_varints(b"")) == 0
+
+
+@pytest.mark.parametrize("encoding", [name for name in ver12.INTERVAL_ENCODINGS if name != "text-ms"])
+@pytest.mark.parametrize("length", [0, 1, 60, 2000])  # the longer payloads take the numpy path
+def test_intervals_round_trip(encoding, length):
+    encode, decode, _ = ver12.INTERVAL_ENCODINGS[encoding]
+    intervals = human_intervals(length, length)
+    scale = 1e6 if encoding.startswith("varint-us") else 1e3
+    assert np.allclose(decode(encode(intervals)), intervals, atol=0.6 / scale, rtol=0)
+
+
+def test_loop_and_numpy_paths_agree(monkeypatch):
+    payload = ver12.encode_intervals_varint(human_intervals(1), 1000)
+    looped = ver12.decode_intervals_varint(payload, 1000)
+    monkeypatch.setattr(ver12, "VARINT_LOOP_BYTES", 0)
+    assert np.array_equal(ver12.decode_intervals_varint(payload, 1000), looped)
+
+
+def test_negative_deltas():
+    intervals = np.array([2.0, 0.001, 1.5, 0.0, 0.0, 3.25])
+    assert np.allclose(ver12.decode_intervals_varint(ver12.encode_intervals_varint(intervals, 1000), 1000), intervals)
+
+
+@pytest.mark.parametrize("encoding", list(ver12.INTERVAL_ENCODINGS))
+def test_batch_decode_matches_one_at_a_time(encoding):
+    encode, decode, decode_batch = ver12.INTERVAL_ENCODINGS[encoding]
+    payloads = [encode(human_intervals(seed, 20 + seed * 37)) for seed in range(12)]
+    for batched, payload in zip(decode_batch(payloads), payloads):
+        assert np.array_equal(batched, decode(payload))
+
+
+def test_batch_decode_mixed_encodings():
+    intervals = human_intervals(3)
+    pending = [None, ("text-ms", ver12.encode_intervals_text(intervals)),
+               ("varint-us", ver12.INTERVAL_ENCODINGS["varint-us"][0](intervals)),
+               ("varint-ms", ver12.INTERVAL_ENCODINGS["varint-ms"][0](np.zeros(0)))]
+    decoded = ver12.decode_intervals_batch(pending)
+    assert decoded[0] is None
+    assert np.allclose(decoded[1], intervals, atol=0.0006)
+    assert np.allclose(decoded[2], intervals, atol=6e-7)
+    assert len(decoded[3]) == 0
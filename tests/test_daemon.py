@@ -0,0 +1,29 @@
+"""
+StatsDaemon.answer(): the protocol without a socket.
+"""
+import json
+
+import ver12
+
+
+def answer(daemon, line):
+    response = daemon.answer(line)
+    return json.loads(response) if isinstance(response, bytes) else response
+
+
+def test_ping_and_stats(mixed_archive):
+    daemon = ver12.StatsDaemon()
+    assert answer(daemon, "ping\n") == {"ok": True, "result": {"sessions": 9}}
+    result = answer(daemon, 'stats {"min_wpm": 63.5, "since": "20250101_000000"}\n')["result"]
+    assert tuple(result["fields"]) == ver12.STATS_EXPORT_FIELDS
+    assert [row[0] for row in result["rows"]] == ["stats20250104_090000.txt", "stats20250105_090000.txt"]
+    flagged = answer(daemon, 'stats {"exclude_flagged": true, "passages": null}\n')["result"]["rows"]
+    assert len(flagged) == 6
+
+
+def test_bad_requests(mixed_archive):
+    daemon = ver12.StatsDaemon()
+    assert answer(daemon, "drop\n") == {"ok": False, "error": "unknown op 'drop'"}
+    assert answer(daemon, "stats {not json}\n") == {"ok": False, "error": "malformed query"}
+    assert answer(daemon, 'stats {"min_wpm": "fast"}\n') == {"ok": False, "error": "malformed query"}
+    assert answer(daemon, "stats [1]\n") == {"ok": False, "error": "malformed query"}
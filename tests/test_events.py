@@ -0,0 +1,27 @@
+"""
+The key event log: varint encoding and the text form of older files.
+"""
+import ver12
+
+
+def test_event_log_round_trip():
+    log = ver12.EventLog(0.0)
+    now = 0.0
+    for key, kind in [("T", ver12.EventLog.CORRECT), ("x", ver12.EventLog.WRONG),
+                      ("\x7f", ver12.EventLog.BACKSPACE), ("é", ver12.EventLog.CORRECT),
+                      ("UP", ver12.EventLog.NAMED_KEY)]:
+        now += 0.123456789
+        log.record(key, kind, now)
+    decoded = ver12.EventLog.decode(log.encode())
+    assert decoded.kinds == log.kinds
+    assert decoded.keys == log.keys
+    assert decoded.deltas_ns == log.deltas_ns
+
+
+def test_legacy_key_events():
+    assert ver12.legacy_key_events(None) is None
+    decoded = ver12.EventLog.decode(ver12.legacy_key_events("C84+303124000 W120+51002311 B127+9000 C104+1"))
+    assert list(decoded.kinds) == [ver12.EventLog.CORRECT, ver12.EventLog.WRONG, ver12.EventLog.BACKSPACE,
+                                   ver12.EventLog.CORRECT]
+    assert list(decoded.keys) == [84, 120, 127, 104]
+    assert list(decoded.deltas_ns) == [303124000, 51002311, 9000, 1]
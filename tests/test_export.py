@@ -0,0 +1,31 @@
+"""
+Parquet export over an archive that mixes every signed session layout.
+"""
+import os
+
+import numpy as np
+import pytest
+
+import ver12
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def exported(batch_rows=ver12.EXPORT_BATCH_ROWS):
+    assert ver12.export_parquet("sessions.parquet", batch_rows) is not None
+    return pq.read_table("sessions.parquet").to_pydict()
+
+
+@pytest.mark.parametrize("batch_rows", [1, 2, ver12.EXPORT_BATCH_ROWS])
+def test_export_mixed_formats(mixed_archive, batch_rows):
+    table = exported(batch_rows)
+    # ver10 files and cheat files are not signed, so they are left out
+    assert table["session"] == ["stats20240105_090000.txt", "stats20250101_090000.txt",
+                                "stats20250102_090000.txt", "stats20250104_090000.txt",
+                                "stats20250105_090000.txt"]
+    assert table["format"] == ["ver11", "ver12", "ver12", "ver12", "ver12"]
+    assert table["intervals"][0] is None  # ver11 signs its first five lines only
+    for name, intervals in zip(table["session"][1:], table["intervals"][1:]):
+        with open(os.path.join(ver12.STATS_FOLDER, name), "r", encoding='utf-8') as f:
+            record = ver12.parse_session_lines(name, f.read().splitlines())
+        assert np.allclose(intervals, record.intervals)
@@ -0,0 +1,142 @@
+"""
+Format sniffing of parse_session_lines() and parse_summary_line(): one
+fixture file per layout ever written, from ver1 score files to schema 2.
+"""
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import ver12
+from conftest import FIXTURES
+
+SENTENCE = "The quick brown fox jumps over the lazy dog."
+
+
+def parse(name, payload=True):
+    path = os.path.join(FIXTURES, name)
+    with open(path, "r", encoding='utf-8') as f:
+        return ver12.parse_session_lines(path, f.read().splitlines(), payload)
+
+
+def summaries(name):
+    return list(ver12.iter_stats_records([os.path.join(FIXTURES, name)]))
+
+
+@pytest.mark.parametrize("name, file_format, wpm, accuracy, has_intervals", [
+    ("ver1-4/score20240101_090000.txt", "ver1-9", 41.2, 97.5, False),
+    ("ver5-8/score20240102_090000.txt", "ver1-9", 55.1, 98.0, True),
+    ("ver10/stats20240104_090000.txt", "ver10", 60.0, 99.0, True),
+])
+def test_unsigned_sessions(name, file_format, wpm, accuracy, has_intervals):
+    record = parse(name)
+    assert (record.format, record.wpm, record.accuracy, record.verified, record.cheat) == \
+        (file_format, wpm, accuracy, None, False)
+    assert (record.intervals is not None) == has_intervals
+    if file_format == "ver10":
+        assert record.sentence == SENTENCE
+        assert record.passage == ver12.passage_id(SENTENCE)
+
+
+def test_ver11_signs_five_lines():
+    record = parse("ver11/stats20240105_090000.txt")
+    assert (record.format, record.verified, record.wpm) == ("ver11", True, 62.0)
+    assert len(record.intervals) == len(SENTENCE)
+
+
+def test_ver11_edited_fails():
+    path = os.path.join(FIXTURES, "ver11/stats20240105_090000.txt")
+    with open(path, "r", encoding='utf-8') as f:
+        lines = f.read().replace("WPM: 62.00", "WPM: 92.00").splitlines()
+    record = ver12.parse_session_lines(path, lines)
+    assert (record.format, record.verified) == ("ver11", False)
+
+
+@pytest.mark.parametrize("name, timestamp", [
+    ("ver12_schema1/stats20250101_090000.txt", "20250101_090000"),  # bare HMAC-SHA256
+    ("ver12_schema1/stats20250102_090000.txt", "20250102_090000"),  # algorithm:key:digest
+])
+def test_ver12_schema1(name, timestamp):
+    record = parse(name)
+    assert (record.format, record.verified, record.timestamp, record.sentence) == \
+        ("ver12", True, timestamp, SENTENCE)
+    # Key events written as text before the varint encoding read like new ones
+    events = ver12.EventLog.decode(record.key_events)
+    assert events.count(ver12.EventLog.CORRECT) == len(SENTENCE)
+    assert events.count(ver12.EventLog.WRONG) == 1
+
+
+@pytest.mark.parametrize("name, file_format", [
+    ("ver9/stats20240103_090000.txt", "ver1-9"),
+    ("ver10/stats20240104_100000.txt", "ver10"),
+    ("ver11/stats20240105_100000.txt", "ver11"),
+    ("ver12_schema1/stats20250103_100000.txt", "ver12"),
+])
+def test_cheat_files(name, file_format):
+    record = parse(name)
+    assert (record.format, record.cheat, record.wpm, record.verified) == (file_format, True, None, None)
+    assert record.timestamp == os.path.basename(name)[len("stats"):-len(".txt")]
+
+
+def test_schema2_inline_sentence():
+    record = parse("ver12_schema2/stats20250104_090000.txt")
+    assert (record.format, record.verified, record.elapsed, record.sentence) == ("ver12", True, 8.123, SENTENCE)
+    assert len(record.intervals) == len(SENTENCE)
+    assert ver12.EventLog.decode(record.key_events).count(ver12.EventLog.WRONG) == 1
+
+
+def test_schema2_passage_table(workdir):
+    name = "ver12_schema2/stats20250105_090000.txt"
+    record = parse(name)
+    assert (record.verified, record.sentence) == (True, None)  # no passage table here
+
+    shutil.copytree(os.path.join(FIXTURES, "ver12_schema2", "passages"), ver12.PASSAGES_FOLDER)
+    ver12.resolve_passage.cache_clear()  # the miss above is cached
+    record = parse(name)
+    assert (record.format, record.verified, record.sentence) == ("ver12", True, SENTENCE)
+    inline = parse("ver12_schema2/stats20250104_090000.txt")
+    assert np.allclose(record.intervals, inline.intervals)
+    assert record.key_events == inline.key_events
+
+
+def test_schema2_header_only():
+    record = parse("ver12_schema2/stats20250105_090000.txt", payload=False)
+    assert (record.wpm, record.accuracy, record.verified) == (64.0, 97.78, True)
+    assert record.intervals is None and record.sentence is None
+
+
+def test_schema2_unknown_interval_encoding():
+    path = os.path.join(FIXTURES, "ver12_schema2/stats20250105_090000.txt")
+    with open(path, "r", encoding='utf-8') as f:
+        lines = f.read().replace("varint-ms", "varint-ns").splitlines()
+    assert ver12.parse_session_lines(path, lines) is None
+
+
+def test_summary_rows_ver5():
+    [record] = summaries("ver5-8/stats.txt")
+    assert (record.format, record.wpm, record.elapsed, record.accuracy, record.avg_time) == \
+        ("summary", 55.1, 9.87, 98.0, 0.138)
+
+
+def test_summary_rows_ver9_cheat():
+    run, cheat = summaries("ver9/stats.txt")
+    assert (run.cheat, run.wpm) == (False, 50.0)
+    assert (cheat.cheat, cheat.wpm, cheat.timestamp) == (True, None, "20240103_090000")
+
+
+def test_summary_rows_ver10_sentence():
+    run, cheat = summaries("ver10/stats.txt")
+    assert (run.format, run.sentence) == ("ver10 summary", "Hello, world, again.")
+    assert (cheat.cheat, cheat.sentence) == (True, SENTENCE)
+
+
+def test_summary_rows_unknown_time():
+    unknown, known = summaries("ver12_schema1/stats.txt")
+    assert unknown.elapsed is None
+    assert known.elapsed == 8.12
+
+
+def test_folder_mixes_sessions_and_summaries():
+    records = list(ver12.iter_stats_records([os.path.join(FIXTURES, "ver12_schema1")]))
+    assert sorted(record.format for record in records) == ["summary", "summary", "ver12", "ver12", "ver12"]
@@ -0,0 +1,38 @@
+"""
+KeyboardSession on a pseudo-terminal: batched reads and the Enter prompt.
+"""
+import os
+import sys
+
+import pytest
+
+import ver12
+
+pty = pytest.importorskip("pty")
+
+
+@pytest.fixture
+def terminal(monkeypatch):
+    master, slave = pty.openpty()
+    with open(slave, "r", encoding='utf-8') as stdin:
+        monkeypatch.setattr(sys, "stdin", stdin)
+        yield master
+    os.close(master)
+
+
+def test_keys_sent_with_enter_reach_the_test(terminal):
+    with ver12.KeyboardSession() as keyboard:
+        os.write(terminal, b"x\rConsistency")
+        keyboard.wait_for_enter()
+        assert keyboard.key_ready(0)
+        _, keys = keyboard.read_keys()
+        assert "".join(keys) == "Consistency"
+        assert not keyboard.key_ready(0)
+
+
+def test_escape_sequences_in_one_read(terminal):
+    with ver12.KeyboardSession() as keyboard:
+        os.write(terminal, b"a\x1b[Ab")
+        assert keyboard.key_ready(1)
+        _, keys = keyboard.read_keys()
+        assert keys == ["a", "KEY_UP", "b"]
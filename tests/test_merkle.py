@@ -0,0 +1,98 @@
+"""
+The Merkle index: frontier appends, the leaf log, and diffs by name.
+"""
+import json
+import os
+
+import pytest
+
+import ver12
+
+
+def leaf(i, content=b"session"):
+    return ver12.merkle_leaf(f"stats2026{i:06d}.txt", content)
+
+
+def append_all(count, start=0):
+    frontier = ver12.load_merkle_frontier()
+    for i in range(start, start + count):
+        ver12.merkle_append(frontier, f"stats2026{i:06d}.txt", leaf(i))
+    ver12.save_merkle_frontier(frontier)
+    return frontier
+
+
+@pytest.mark.parametrize("count", range(1, 34))
+def test_peaks_give_the_tree_root(count):
+    leaves = [leaf(i) for i in range(count)]
+    assert ver12.merkle_peaks_root(ver12.merkle_peaks(leaves)) == ver12.build_merkle_levels(leaves)[-1][0]
+
+
+def test_append_matches_full_index(workdir):
+    frontier = append_all(21)
+    index = ver12.load_merkle_index()
+    assert frontier["sessions"] == len(index["names"]) == 21
+    assert ver12.merkle_peaks_root(frontier["peaks"]) == ver12.merkle_root(index)
+    assert frontier["last_leaf"] == index["levels"][0][-1]
+
+
+def test_out_of_order_and_resaved(workdir):
+    frontier = append_all(10, start=5)
+    ver12.merkle_append(frontier, "stats2026000002.txt", leaf(2))  # clock set back
+    ver12.merkle_append(frontier, "stats2026000014.txt", leaf(14, b"saved again"))
+    index = ver12.load_merkle_index()
+    assert index["names"][0] == "stats2026000002.txt"
+    assert index["levels"][0][-1] == leaf(14, b"saved again")
+    assert frontier["sessions"] == 11
+    assert ver12.merkle_peaks_root(frontier["peaks"]) == ver12.merkle_root(index)
+
+
+def test_torn_log_line(workdir):
+    append_all(6)
+    with open(ver12.MERKLE_LOG_FILE, "ab") as f:
+        f.write(b"stats2026999999.txt 12ab")  # a crash in the middle of an append
+    frontier = ver12.load_merkle_frontier()
+    assert frontier["sessions"] == 6
+    ver12.merkle_append(frontier, "stats2026000006.txt", leaf(6))
+    with open(ver12.MERKLE_LOG_FILE, "r", encoding='utf-8') as f:
+        assert "12ab" not in f.read()
+    assert ver12.merkle_peaks_root(frontier["peaks"]) == ver12.merkle_root(ver12.load_merkle_index())
+
+
+def test_old_full_index_is_converted(workdir):
+    leaves = [leaf(i) for i in range(9)]
+    index = {"names": [f"stats2026{i:06d}.txt" for i in range(9)], "levels": ver12.build_merkle_levels(leaves)}
+    with open(ver12.MERKLE_INDEX_FILE, "w", encoding='utf-8') as f:
+        json.dump(index, f)
+    frontier = ver12.load_merkle_frontier()
+    assert os.path.isfile(ver12.MERKLE_LOG_FILE)
+    assert ver12.merkle_peaks_root(frontier["peaks"]) == ver12.merkle_root(index)
+
+
+def index_of(leaves_by_number):
+    names = [f"stats2026{i:06d}.txt" for i in sorted(leaves_by_number)]
+    leaves = [leaves_by_number[i] for i in sorted(leaves_by_number)]
+    return {"names": names, "levels": ver12.build_merkle_levels(leaves)}
+
+
+def test_diff_changed_leaf_walks_one_path():
+    a = index_of({i: leaf(i) for i in range(64)})
+    b = index_of({i: leaf(i, b"edited") if i == 40 else leaf(i) for i in range(64)})
+    changed, only_a, only_b, comparisons = ver12.merkle_diff(a, b)
+    assert (changed, only_a, only_b) == (["stats2026000040.txt"], [], [])
+    assert comparisons <= 2 * 7 + 1
+
+
+def test_diff_deletion_reports_one_session():
+    a = index_of({i: leaf(i) for i in range(64)})
+    b = index_of({i: leaf(i) for i in range(64) if i != 10})
+    changed, only_a, only_b, _ = ver12.merkle_diff(a, b)
+    assert (changed, only_a, only_b) == ([], ["stats2026000010.txt"], [])
+    changed, only_a, only_b, _ = ver12.merkle_diff(b, a)
+    assert (changed, only_a, only_b) == ([], [], ["stats2026000010.txt"])
+
+
+def test_diff_deletion_and_edit():
+    a = index_of({i: leaf(i) for i in range(30)})
+    b = index_of({i: leaf(i, b"edited") if i == 20 else leaf(i) for i in range(31) if i != 3})
+    changed, only_a, only_b, _ = ver12.merkle_diff(a, b)
+    assert (changed, only_a, only_b) == (["stats2026000020.txt"], ["stats2026000003.txt"], ["stats2026000030.txt"])
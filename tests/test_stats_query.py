@@ -0,0 +1,47 @@
+"""
+The "stats" command: filters and CSV/JSON lines output over a mixed archive.
+"""
+import csv
+import json
+
+import pytest
+
+import ver12
+
+SENTENCE = "The quick brown fox jumps over the lazy dog."
+
+
+def stats(capsys, *options):
+    ver12.main(["stats", "--format", "jsonl", *options])
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+@pytest.mark.parametrize("options, sessions", [
+    ((), ["stats20240104_090000.txt", "stats20240104_100000.txt", "stats20240105_090000.txt",
+          "stats20240105_100000.txt", "stats20250101_090000.txt", "stats20250102_090000.txt",
+          "stats20250103_100000.txt", "stats20250104_090000.txt", "stats20250105_090000.txt"]),
+    (("--since", "2025-01-02", "--until", "2025-01-04"),
+     ["stats20250102_090000.txt", "stats20250103_100000.txt", "stats20250104_090000.txt"]),
+    (("--min-wpm", "63.5"), ["stats20250104_090000.txt", "stats20250105_090000.txt"]),
+    (("--exclude-flagged", "--since", "2024-01-05", "--until", "2024-12-31"), ["stats20240105_090000.txt"]),
+])
+def test_filters(mixed_archive, capsys, options, sessions):
+    assert [row["session"] for row in stats(capsys, *options)] == sessions
+
+
+def test_sentence_by_text_or_passage_id(mixed_archive, capsys):
+    by_text = stats(capsys, "--sentence", SENTENCE, "--exclude-flagged")
+    by_id = stats(capsys, "--sentence", ver12.passage_id(SENTENCE), "--exclude-flagged")
+    assert by_text == by_id
+    assert len(by_text) == 6
+    # Schema 2 files only name their passage; the output looks the sentence up
+    assert all(row["sentence"] == SENTENCE for row in by_text)
+
+
+def test_csv_output_file(mixed_archive, capsys):
+    ver12.main(["stats", "--output", "sessions.csv", "--min-wpm", "60"])
+    assert "Wrote 6 sessions to sessions.csv." in capsys.readouterr().out
+    with open("sessions.csv", "r", encoding='utf-8', newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == list(ver12.STATS_EXPORT_FIELDS)
+    assert [row["wpm"] for row in rows] == ["60.0", "62.0", "63.0", "63.0", "64.0", "64.0"]
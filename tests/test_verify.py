@@ -0,0 +1,47 @@
+"""
+Server-side verification of submitted sessions.
+"""
+import pytest
+
+import ver12
+
+SENTENCE = ver12.SENTENCES[0]
+
+
+@pytest.mark.parametrize("kind", ["human", "jitter"])
+def test_genuine_sessions_pass(kind):
+    result = ver12.verify_submission(ver12.simulated_submission((kind, 1, SENTENCE, None)))
+    assert (result["valid"], result["reason"]) == (True, None)
+    assert result["risk"] < ver12.ANTICHEAT_RISK_THRESHOLD
+
+
+@pytest.mark.parametrize("tamper, reason", [
+    ("edited", "bad signature"),
+    ("inflated", "WPM does not match key events"),
+])
+def test_tampered_sessions_fail(tamper, reason):
+    result = ver12.verify_submission(ver12.simulated_submission(("human", 1, SENTENCE, tamper)))
+    assert (result["valid"], result["reason"]) == (False, reason)
+
+
+@pytest.mark.parametrize("kind", ["constant", "burst"])
+def test_bots_are_flagged(kind):
+    result = ver12.verify_submission(ver12.simulated_submission((kind, 1, SENTENCE, None)))
+    assert (result["valid"], result["reason"]) == (False, "machine-like input")
+
+
+def test_unfinished_passage():
+    elapsed, time_stamps, event_log, error_log = ver12.play_simulated_session("human", 1, SENTENCE)
+    content = ver12.format_session(60.0, 100.0, "20260101_000000", time_stamps, SENTENCE + " And more.",
+                                   error_log, event_log, elapsed=elapsed)
+    assert ver12.verify_submission(content)["reason"] == "passage not finished"
+
+
+def test_pool_keeps_submission_order():
+    jobs = [("human", 1, SENTENCE, None), ("human", 2, SENTENCE, "edited"), ("constant", 3, SENTENCE, None),
+            ("human", 4, SENTENCE, "inflated"), ("replay", 5, SENTENCE, None)]
+    submissions = [ver12.simulated_submission(job) for job in jobs]
+    results = list(ver12.verify_submissions(submissions, workers=2, max_pending=1))
+    assert [result["reason"] for result in results] == \
+        [ver12.verify_submission(content)["reason"] for content in submissions]
+    assert [result["valid"] for result in results] == [True, False, False, False, True]
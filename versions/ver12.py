@@ -0,0 +1,3930 @@
+import time
+import datetime
+import os
+import sys
+import random
+import statistics
+import hashlib
+import hmac
+import json
+import math
+import shutil
+import signal
+import socket
+import socketserver
+import argparse
+import functools
+import heapq
+import codecs
+import csv
+import base64
+import multiprocessing
+import itertools
+import tempfile
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter, deque, namedtuple
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+# Secret key used for HMAC signing of stats files
+SECRET_KEY = b"change_this_to_random_secret_key"
+
+# Signing keys by key ID. To rotate, add a key and point SIGNING_KEY_ID at it;
+# files signed with older keys keep verifying as long as their key is listed.
+SIGNING_KEYS = {"k1": SECRET_KEY}  # blake2b takes keys of up to 64 bytes
+SIGNING_KEY_ID = "k1"
+SIGNING_ALGORITHM = "blake2b"  # one of SIGNING_ALGORITHMS; "bench signing" compares them
+LEGACY_SIGNATURE = ("sha256", "k1")  # HMAC lines from before algorithm IDs hold a bare HMAC-SHA256
+
+STATS_FOLDER = "stats"
+KEY_BATCH_BYTES = 4096  # most input bytes taken from the terminal in one read
+ESCAPE_TIMEOUT = 0.05  # a lone ESC with nothing following within 50ms is the Escape key
+AGGREGATES_FILE = os.path.join(STATS_FOLDER, "aggregates.json")
+
+# Rolling aggregates settings
+EMA_ALPHA = 0.2  # weight of the newest run in the moving averages
+TREND_TOLERANCE = 0.02  # +-2% around the moving average counts as "steady"
+WPM_SKETCH_BUCKETS = 300  # 1 WPM wide buckets, last bucket collects everything faster
+
+# Level-of-detail plotting settings
+ROLLUPS_FILE = os.path.join(STATS_FOLDER, "rollups.json")
+ROLLUP_TIERS = (16, 256, 4096)  # runs per bucket in each precomputed tier
+MAX_PLOT_POINTS = 2000  # most points drawn per line, whatever the history size
+MARKER_PLOT_POINTS = 200  # draw per-run markers only for short histories
+PLOT_METRICS = ("wpm", "accuracy", "time", "avg_time")
+
+# Live in-game metrics settings
+STATUS_REFRESH_INTERVAL = 0.1  # recompute the status line at most 10 times per second
+ROLLING_KEYS = 10  # keys in the rolling WPM window
+RENDER_HZ = 120  # screen refreshes per second during a test, however fast keys arrive
+
+# Anti-cheat scoring: one weight per anticheat_features() entry
+MIN_TIME_THRESHOLD = 0.03  # 30ms minimum between keystrokes suspiciously fast
+MAX_STD_THRESHOLD = 0.005  # very low std dev = very consistent timing
+ANTICHEAT_FEATURES = ("low_variation", "low_entropy", "no_autocorrelation", "bigram_inconsistency",
+                      "fast_bursts", "rhythm_shift", "no_corrections", "legacy_rule", "bigram_shift")
+ANTICHEAT_WEIGHTS = np.array([5.0, 3.0, 0.5, 2.0, 4.0, 3.0, 1.0, 6.0, 2.5])
+ANTICHEAT_BIAS = -4.0
+ANTICHEAT_RISK_THRESHOLD = 0.5
+
+# Per-player typing fingerprint used by the anti-cheat
+BASELINE_FILE = os.path.join(STATS_FOLDER, "baseline.json")
+BASELINE_MIN_SESSIONS = 3  # verified sessions needed before the baseline is trusted
+BASELINE_MIN_BIGRAM_COUNT = 3  # samples needed before a letter pair is compared
+INTERVAL_BINS = 101  # 10ms histogram bins, the last one collects everything slower than 1s
+
+# Server-side verification settings
+VERIFY_BATCH_SIZE = 64  # submissions per worker task
+VERIFY_WPM_TOLERANCE = 0.01  # claimed WPM may differ 1% from the key events (end of test vs last key)
+VERIFY_INTERVAL_TOLERANCE = 0.0006  # signed intervals are rounded to 1ms
+SUBMISSIONS_FOLDER = "submissions"  # where "submit" writes self-contained copies of session files
+
+# Session file schema: a header of fixed fields, a blank line, then the payloads
+SESSION_SCHEMA = 2  # files without a Schema line are schema 1 (or an older version's layout)
+INTERVAL_ENCODING = "varint-ms"  # one of INTERVAL_ENCODINGS, named in each file's header; "bench codec" compares them
+VARINT_LOOP_BYTES = 128  # shorter varint payloads are decoded by a Python loop, which beats numpy's per-call overhead
+
+# Passage table: sessions name their passage by ID, the text is stored once
+PASSAGES_FOLDER = os.path.join(STATS_FOLDER, "passages")
+PASSAGE_CACHE_SIZE = 256  # passages kept in memory by resolve_passage()
+
+# Archive integrity index and hash chain
+MERKLE_INDEX_FILE = os.path.join(STATS_FOLDER, "merkle.json")  # frontier: session count, subtree peaks, newest leaf
+MERKLE_LOG_FILE = os.path.join(STATS_FOLDER, "merkle.log")  # append-only "name leaf" lines, one per saved file
+CHAIN_CHECKPOINT_FILE = os.path.join(STATS_FOLDER, "chain.json")  # last session file verified
+
+# Archive compaction: old session files are folded into columnar segment files
+SEGMENTS_FOLDER = os.path.join(STATS_FOLDER, "segments")
+COMPACT_AFTER_DAYS = 30  # "compact" folds sessions older than this
+SEGMENT_MAX_SESSIONS = 4096  # sessions per segment file
+SEGMENT_COLUMNS = ("name", "size", "leaf", "prev", "format", "timestamp", "wpm", "accuracy", "elapsed", "avg_time",
+                   "passage", "cheat", "verified", "content")
+
+# Columnar export settings
+EXPORT_BATCH_ROWS = 8192  # sessions per Arrow record batch, which bounds the memory an export needs
+STATS_EXPORT_FIELDS = ("session", "format", "timestamp", "wpm", "accuracy", "elapsed", "avg_time", "passage",
+                       "sentence", "cheat", "verified")  # columns of "stats" CSV and JSON lines output
+
+# Stats query daemon
+DAEMON_SOCKET = os.path.join(STATS_FOLDER, "keydash.sock")
+DAEMON_POLL_INTERVAL = 1.0  # seconds between checks of the stats folder for changes
+DAEMON_TIMEOUT = 0.5  # frontends give up on an unresponsive daemon and read the files themselves
+
+# Passage display settings
+VIEWPORT_MAX_ROWS = 6  # passage lines visible while typing
+PREVIEW_CHARS = 400  # longer passages are only previewed before the test starts
+
+# Named key events. Plain characters stay one-character strings, so a
+# named key can never be mistaken for a letter of the passage.
+CSI_FINAL_KEYS = {  # ESC [ <params> <final>
+    "A": "KEY_UP", "B": "KEY_DOWN", "C": "KEY_RIGHT", "D": "KEY_LEFT",
+    "H": "KEY_HOME", "F": "KEY_END", "Z": "KEY_SHIFT_TAB",
+    "P": "KEY_F1", "Q": "KEY_F2", "R": "KEY_F3", "S": "KEY_F4",
+}
+CSI_TILDE_KEYS = {  # ESC [ <number> ~
+    1: "KEY_HOME", 2: "KEY_INSERT", 3: "KEY_DELETE", 4: "KEY_END",
+    5: "KEY_PAGE_UP", 6: "KEY_PAGE_DOWN", 7: "KEY_HOME", 8: "KEY_END",
+    11: "KEY_F1", 12: "KEY_F2", 13: "KEY_F3", 14: "KEY_F4",
+    15: "KEY_F5", 17: "KEY_F6", 18: "KEY_F7", 19: "KEY_F8",
+    20: "KEY_F9", 21: "KEY_F10", 23: "KEY_F11", 24: "KEY_F12",
+}
+SS3_KEYS = {  # ESC O <final>, sent in application cursor mode
+    "A": "KEY_UP", "B": "KEY_DOWN", "C": "KEY_RIGHT", "D": "KEY_LEFT",
+    "H": "KEY_HOME", "F": "KEY_END",
+    "P": "KEY_F1", "Q": "KEY_F2", "R": "KEY_F3", "S": "KEY_F4",
+}
+LINUX_CONSOLE_KEYS = {  # ESC [ [ <final>, F1-F5 on the Linux console
+    "A": "KEY_F1", "B": "KEY_F2", "C": "KEY_F3", "D": "KEY_F4", "E": "KEY_F5",
+}
+WINDOWS_SPECIAL_KEYS = {  # second character after a \x00 or \xe0 prefix
+    "H": "KEY_UP", "P": "KEY_DOWN", "M": "KEY_RIGHT", "K": "KEY_LEFT",
+    "G": "KEY_HOME", "O": "KEY_END", "I": "KEY_PAGE_UP", "Q": "KEY_PAGE_DOWN",
+    "R": "KEY_INSERT", "S": "KEY_DELETE",
+    ";": "KEY_F1", "<": "KEY_F2", "=": "KEY_F3", ">": "KEY_F4", "?": "KEY_F5",
+    "@": "KEY_F6", "A": "KEY_F7", "B": "KEY_F8", "C": "KEY_F9", "D": "KEY_F10",
+    "\x85": "KEY_F11", "\x86": "KEY_F12",
+}
+
+
+class EscapeDecoder:
+    """
+    State machine that turns terminal input into key events in one pass.
+    Whole escape sequences (arrows, function keys, Home/End...) become a
+    single named event instead of an ESC and a few stray letters. A sequence
+    split across reads is kept until the next feed() or flush().
+    """
+
+    GROUND, ESCAPE, CSI, SS3, LINUX_CONSOLE = range(5)
+
+    def __init__(self):
+        self.state = self.GROUND
+        self.params = ""
+
+    @property
+    def pending(self):
+        return self.state != self.GROUND
+
+    def feed(self, chars):
+        events = []
+        for ch in chars:
+            state = self.state
+            if state == self.GROUND:
+                if ch == "\x1b":
+                    self.state = self.ESCAPE
+                else:
+                    events.append(ch)
+            elif state == self.ESCAPE:
+                if ch == "[":
+                    self.state = self.CSI
+                    self.params = ""
+                elif ch == "O":
+                    self.state = self.SS3
+                else:
+                    # ESC followed by anything else was a plain Escape key press
+                    events.append("KEY_ESCAPE")
+                    self.state = self.GROUND
+                    events.extend(self.feed(ch))
+            elif state == self.CSI:
+                if ch == "[" and not self.params:
+                    self.state = self.LINUX_CONSOLE
+                elif "\x20" <= ch <= "\x3f":
+                    self.params += ch  # parameter and intermediate bytes
+                else:
+                    events.append(self.csi_key(ch))
+                    self.state = self.GROUND
+            elif state == self.SS3:
+                events.append(SS3_KEYS.get(ch, "KEY_UNKNOWN"))
+                self.state = self.GROUND
+            else:
+                events.append(LINUX_CONSOLE_KEYS.get(ch, "KEY_UNKNOWN"))
+                self.state = self.GROUND
+        return events
+
+    def csi_key(self, final):
+        if final == "~":
+            # Modifiers come after a ';' (ESC [ 3 ; 5 ~), only the key number matters
+            number = self.params.split(";")[0]
+            return CSI_TILDE_KEYS.get(int(number) if number.isdigit() else 0, "KEY_UNKNOWN")
+        return CSI_FINAL_KEYS.get(final, "KEY_UNKNOWN")
+
+    def flush(self):
+        # Input went quiet in the middle of a sequence: report what was pressed
+        events = []
+        if self.state == self.ESCAPE:
+            events.append("KEY_ESCAPE")
+        elif self.state != self.GROUND:
+            events.append("KEY_UNKNOWN")
+        self.state = self.GROUND
+        return events
+
+
+# Cross-platform getch: Windows and Unix
+if os.name == 'nt':
+    import msvcrt
+
+    def getch():
+        ch = msvcrt.getwch()
+        if ch == '\x00' or ch == '\xe0':  # Special keys
+            return WINDOWS_SPECIAL_KEYS.get(msvcrt.getwch(), "KEY_UNKNOWN")
+        return ch
+
+    class KeyboardSession:
+        """
+        Keyboard access for the typing loop. The Windows console needs no mode
+        switch, so this only adds key_ready() next to getch().
+        """
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def clock(self):
+            return time.perf_counter()
+
+        def key_ready(self, timeout):
+            # msvcrt cannot block with a timeout, so poll kbhit() every millisecond
+            deadline = None if timeout is None else time.perf_counter() + timeout
+            while not msvcrt.kbhit():
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return False
+                time.sleep(0.001)
+            return True
+
+        def read_keys(self):
+            """
+            Drains every key already waiting. Returns (timestamp, keys): one
+            clock read for the whole batch, keys in arrival order.
+            """
+            now = time.perf_counter()
+            keys = []
+            while msvcrt.kbhit():
+                keys.append(getch())
+            return now, keys
+
+        def wait_for_enter(self):
+            # msvcrt hands over one key at a time, so nothing typed after Enter is read here
+            while getch() not in ("\r", "\n"):
+                pass
+else:
+    import select
+    import tty
+    import termios
+
+    def getch():
+        fd = sys.stdin.fileno()
+        old_settings = termios.tcgetattr(fd)
+        try:
+            tty.setraw(fd)
+            ch = sys.stdin.read(1)
+            if ord(ch) == 3:  # Ctrl-C
+                raise KeyboardInterrupt
+        finally:
+            termios.tcsetattr(fd, termios.TCSADRAIN, old_settings)
+        return ch
+
+    class KeyboardSession:
+        """
+        Keeps the terminal in cbreak mode for a whole typing test instead of
+        switching modes around every key, and lets the loop wait for input
+        with a timeout. cbreak keeps output processing and Ctrl-C intact.
+        """
+
+        def __enter__(self):
+            self.fd = sys.stdin.fileno()
+            self.old_settings = termios.tcgetattr(self.fd)
+            # Multibyte UTF-8 characters and escape sequences may be split across two reads
+            self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            self.escapes = EscapeDecoder()
+            self.pending = None
+            tty.setcbreak(self.fd)
+            return self
+
+        def __exit__(self, *exc_info):
+            termios.tcsetattr(self.fd, termios.TCSADRAIN, self.old_settings)
+            return False
+
+        def clock(self):
+            return time.perf_counter()
+
+        def key_ready(self, timeout):
+            if self.pending:
+                return True
+            ready, _, _ = select.select([self.fd], [], [], timeout)
+            return bool(ready)
+
+        def read_keys(self):
+            """
+            Drains everything the terminal has buffered with one os.read.
+            Returns (timestamp, keys): one clock read for the whole batch,
+            keys in arrival order with escape sequences decoded to named keys.
+            """
+            if self.pending:
+                keys, self.pending = self.pending, None
+                return time.perf_counter(), keys
+            # Read straight from the fd: sys.stdin would buffer keys select() cannot see
+            data = os.read(self.fd, KEY_BATCH_BYTES)
+            now = time.perf_counter()
+            if not data:
+                raise EOFError
+            keys = self.escapes.feed(self.decoder.decode(data))
+            if self.escapes.pending and not self.key_ready(ESCAPE_TIMEOUT):
+                keys.extend(self.escapes.flush())
+            return now, keys
+
+        def wait_for_enter(self):
+            """
+            Blocks until Enter is pressed. Keys that arrived in the same read
+            after it (a paste, or a test harness writing everything at once)
+            are kept for the first read_keys().
+            """
+            while True:
+                _, keys = self.read_keys()
+                for index, ch in enumerate(keys):
+                    if ch in ("\r", "\n"):
+                        self.pending = keys[index + 1:] or None
+                        return
+
+
+SENTENCES = [
+    "The quick brown fox jumps over the lazy dog.",
+    "Python is an awesome programming language.",
+    "Type as fast and accurately as you can!",
+    "Artificial intelligence is the future.",
+    "Practice makes perfect in typing speed games.",
+    "OpenAI develops powerful AI models.",
+    "Consistency is key to mastery.",
+    "Always challenge yourself to improve.",
+    "Debugging is twice as hard as writing code.",
+    "A journey of a thousand miles begins with a single step."
+]
+
+
+def get_text():
+    texts = SENTENCES
+    print("Choose a sentence to type:")
+    for i, sentence in enumerate(texts, 1):
+        print(f"{i}. {sentence}")
+    print(f"{len(texts)+1}. Random sentence")
+    print(f"{len(texts)+2}. Passage from a text file")
+
+    while True:
+        choice = input(f"Enter choice (1-{len(texts)+2}): ").strip()
+        if choice.isdigit():
+            choice_num = int(choice)
+            if 1 <= choice_num <= len(texts):
+                return texts[choice_num - 1]
+            elif choice_num == len(texts) + 1:
+                return random.choice(texts)
+            elif choice_num == len(texts) + 2:
+                passage = load_passage(input("Path to passage file: ").strip())
+                if passage:
+                    return passage
+                continue
+        print("Invalid choice. Please try again.")
+
+
+def load_passage(path):
+    """
+    Reads a paragraph or page length passage. Line breaks and runs of
+    whitespace become single spaces, so the whole passage is typed as one text.
+    """
+    try:
+        with open(path, "r", encoding='utf-8') as f:
+            passage = " ".join(f.read().split())
+    except (OSError, UnicodeDecodeError) as e:
+        print(f"Could not read passage: {e}")
+        return None
+    if not passage:
+        print("Passage file is empty.")
+        return None
+    return passage
+
+
+def calculate_wpm(num_chars, elapsed_seconds):
+    words = num_chars / 5  # Standard word length
+    minutes = elapsed_seconds / 60
+    if minutes == 0:
+        return 0
+    return words / minutes
+
+
+def calculate_keystroke_accuracy(correct_keys, wrong_keys):
+    """
+    Share of letter keystrokes that were right the first time. With error
+    blocking the final text is always correct, so this is the real accuracy.
+    """
+    total = correct_keys + wrong_keys
+    if total == 0:
+        return 100.0
+    return correct_keys / total * 100
+
+
+def legacy_machine_input_rule(time_stamps):
+    """
+    The ver11 detect_machine_input() rule, kept for comparison in evaluations.
+    """
+    if not time_stamps:
+        return False
+
+    min_time = min(time_stamps)
+    std_dev = statistics.stdev(time_stamps) if len(time_stamps) > 1 else 0
+
+    return min_time < MIN_TIME_THRESHOLD and std_dev < MAX_STD_THRESHOLD
+
+
+def key_bigrams(text, positions, count):
+    """
+    The letter pair each of count correct keys completed, as one integer
+    (previous code point * 0x110000 + code point), or -1 for keys without
+    a clean pair. positions are the passage positions from
+    EventLog.pair_positions(). Without them key i is taken to be text[i],
+    which only holds when nothing was deleted, so None is returned when
+    there are more keys than letters.
+    """
+    if positions is None:
+        if count > len(text):
+            return None
+        positions = np.arange(count)
+    positions = np.asarray(positions, dtype=np.int64)
+    codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+    pairs = np.full(len(positions), -1, dtype=np.int64)
+    has_pair = positions >= 1
+    pairs[has_pair] = codes[positions[has_pair] - 1] * 0x110000 + codes[positions[has_pair]]
+    return pairs
+
+
+def bigram_text(pair):
+    return chr(pair // 0x110000) + chr(pair % 0x110000)
+
+
+def anticheat_features(time_stamps, text=None, baseline=None, wrong_keys=None, positions=None):
+    """
+    Turns the interval stream of one session into the ANTICHEAT_FEATURES
+    vector. Every entry is a suspicion level between 0 (human-like) and 1
+    (machine-like), computed with a handful of numpy passes over the intervals.
+
+    text lets per-bigram timing be checked, with positions giving the
+    passage position of each interval's key (EventLog.pair_positions(); see
+    key_bigrams() without it); baseline is the player's fingerprint from
+    load_baseline() to compare the session against.
+    """
+    features = np.zeros(len(ANTICHEAT_FEATURES))
+    if len(time_stamps) < 3:
+        return features
+    stamps = np.asarray(time_stamps, dtype=float)
+    # The first interval is reaction time after Enter, not typing rhythm
+    intervals = stamps[1:]
+    n = len(intervals)
+    pairs = key_bigrams(text, positions, len(stamps)) if text is not None else None
+    mean = intervals.mean()
+    std = intervals.std()
+
+    # Coefficient of variation: macros repeat the same delay
+    cv = std / mean if mean > 0 else 0.0
+    features[0] = np.clip((0.25 - cv) / 0.2, 0, 1)
+
+    # Entropy of the 10ms interval histogram, relative to the most a session this long can have
+    counts = np.bincount(np.minimum(intervals * 100, INTERVAL_BINS - 1).astype(int), minlength=INTERVAL_BINS)
+    probabilities = counts[counts > 0] / n
+    entropy = -(probabilities * np.log(probabilities)).sum()
+    normalized_entropy = entropy / np.log(min(n, INTERVAL_BINS))
+    features[1] = np.clip((0.6 - normalized_entropy) / 0.4, 0, 1)
+
+    # Lag-1 autocorrelation: human rhythm drifts, independent random jitter does not
+    if std > 0:
+        centered = intervals - mean
+        autocorrelation = (centered[:-1] * centered[1:]).mean() / (std * std)
+        features[2] = np.clip(1 - abs(autocorrelation) / 0.1, 0, 1)
+
+    # Per-bigram consistency: a human types the same letter pair at a similar speed,
+    # so repeated bigrams explain part of the variance. Random jitter explains none.
+    # Keys are matched to their letter pair by position, so sessions with backspaces are covered too.
+    if pairs is not None and std > 0:
+        clean = pairs[1:] >= 0
+        paired = intervals[clean]
+        _, groups, group_sizes = np.unique(pairs[1:][clean], return_inverse=True, return_counts=True)
+        repeated = group_sizes[groups] > 1
+        if repeated.sum() >= 8:
+            sums = np.bincount(groups, weights=paired)
+            squares = np.bincount(groups, weights=paired * paired)
+            within = (squares - sums * sums / group_sizes)[group_sizes > 1].sum()
+            total = paired[repeated].var() * repeated.sum()
+            ratio = within / total if total > 0 else 1.0
+            features[3] = np.clip((ratio - 0.6) / 0.4, 0, 1)
+
+    # Burst structure: runs of sub-30ms keys are rollover at best, injected input at worst
+    features[4] = np.clip((intervals < 0.03).mean() / 0.3, 0, 1)
+
+    # Distance from the player's own rhythm: KS statistic between the two 10ms histograms
+    if baseline is not None and baseline["sessions"] >= BASELINE_MIN_SESSIONS:
+        past = np.asarray(baseline["histogram"], dtype=float)
+        ks_distance = np.abs(np.cumsum(counts) / n - np.cumsum(past) / past.sum()).max()
+        features[5] = np.clip((ks_distance - 0.3) / 0.4, 0, 1)
+        if pairs is not None:
+            features[8] = baseline_bigram_shift(baseline, intervals, pairs[1:])
+
+    # Never correcting anything over a long text is unusual for a person
+    if wrong_keys is not None and n >= 100 and wrong_keys == 0:
+        features[6] = 1.0
+
+    # The ver11 rule, on the whole stream like legacy_machine_input_rule()
+    features[7] = float(stamps.min() < MIN_TIME_THRESHOLD and stamps.std(ddof=1) < MAX_STD_THRESHOLD)
+    return features
+
+
+def anticheat_risk(time_stamps, text=None, baseline=None, wrong_keys=None, positions=None):
+    """
+    Risk that a session was typed by a machine, between 0 and 1.
+    Returns (risk, features).
+    """
+    features = anticheat_features(time_stamps, text, baseline, wrong_keys, positions)
+    score = ANTICHEAT_BIAS + features @ ANTICHEAT_WEIGHTS
+    return 1 / (1 + np.exp(-score)), features
+
+
+def detect_machine_input(time_stamps, text=None, baseline=None, wrong_keys=None, positions=None):
+    if len(time_stamps) == 0:
+        return False
+    risk, _ = anticheat_risk(time_stamps, text, baseline, wrong_keys, positions)
+    return risk >= ANTICHEAT_RISK_THRESHOLD
+
+
+def new_baseline():
+    return {
+        "sessions": 0,
+        "histogram": [0] * INTERVAL_BINS,
+        "bigrams": {},  # letter pair -> [count, mean, M2] of log interval (Welford)
+    }
+
+
+def rebuild_baseline():
+    """
+    Builds the fingerprint from the verified sessions on disk. Only needed
+    once, when baseline.json is missing or unreadable.
+    """
+    baseline = new_baseline()
+    for intervals, sentence, positions in iter_verified_intervals():
+        if sentence is not None:
+            update_baseline(baseline, intervals, sentence, positions)
+    return baseline
+
+
+def load_baseline():
+    try:
+        with open(BASELINE_FILE, "r", encoding='utf-8') as f:
+            baseline = json.load(f)
+        if len(baseline.get("histogram", [])) != INTERVAL_BINS:
+            raise ValueError("histogram layout changed")
+        return baseline
+    except (OSError, ValueError):
+        baseline = rebuild_baseline()
+        save_baseline(baseline)  # the full scan only ever happens once
+        return baseline
+
+
+def save_baseline(baseline):
+    os.makedirs(STATS_FOLDER, exist_ok=True)
+    tmp_filename = BASELINE_FILE + ".tmp"
+    with open(tmp_filename, "w", encoding='utf-8') as f:
+        json.dump(baseline, f, separators=(",", ":"))
+    os.replace(tmp_filename, BASELINE_FILE)
+
+
+def update_baseline(baseline, time_stamps, text, positions=None):
+    """
+    Folds one verified session into the fingerprint: the 10ms interval
+    histogram and running mean/variance of log interval per letter pair,
+    the pairs found by key position (see key_bigrams()). The session's
+    pairs are summarised with numpy and merged into the running values
+    once per distinct pair, so the cost depends on the session only.
+    """
+    # The first interval is reaction time
+    intervals = np.asarray(time_stamps, dtype=float)[1:]
+    histogram = baseline["histogram"]
+    bins, counts = np.unique(np.minimum(intervals * 100, INTERVAL_BINS - 1).astype(int), return_counts=True)
+    for index, count in zip(bins.tolist(), counts.tolist()):
+        histogram[index] += count
+
+    pairs = key_bigrams(text, positions, len(intervals) + 1)
+    if pairs is not None:
+        pairs = pairs[1:]
+        clean = pairs >= 0
+        # Pair timings are relative to the session's median, so a fast or slow day keeps the shape
+        x = np.log(np.maximum(intervals[clean], 0.001)) - session_pace(intervals)
+        codes, groups, sizes = np.unique(pairs[clean], return_inverse=True, return_counts=True)
+        means = np.bincount(groups, weights=x) / sizes
+        squares = np.bincount(groups, weights=(x - means[groups]) ** 2)
+        bigrams = baseline["bigrams"]
+        for code, size, mean, m2 in zip(codes.tolist(), sizes.tolist(), means.tolist(), squares.tolist()):
+            # Chan et al.'s merge of two (count, mean, M2) summaries
+            entry = bigrams.setdefault(bigram_text(code), [0, 0.0, 0.0])
+            total = entry[0] + size
+            delta = mean - entry[1]
+            entry[2] += m2 + delta * delta * entry[0] * size / total
+            entry[1] += delta * size / total
+            entry[0] = total
+    baseline["sessions"] += 1
+
+
+def session_pace(intervals):
+    # Log of the median interval: the overall speed of a session
+    if len(intervals) == 0:
+        return 0.0
+    return math.log(max(float(np.median(intervals)), 0.001))
+
+
+def baseline_bigram_shift(baseline, intervals, pairs):
+    """
+    Suspicion that the letter-pair timing no longer matches the player:
+    the median |z| of each key against its bigram's past log intervals
+    (about 0.67 for the same typist) mapped to 0..1. pairs comes from
+    key_bigrams(); the baseline is looked up once per distinct pair and
+    the keys are scored in one vectorized pass.
+    """
+    clean = pairs >= 0
+    if clean.sum() < 10:
+        return 0.0
+    codes, groups = np.unique(pairs[clean], return_inverse=True)
+    means = np.zeros(len(codes))
+    deviations = np.zeros(len(codes))  # 0 = pair not known well enough
+    bigrams = baseline["bigrams"]
+    for i, code in enumerate(codes.tolist()):
+        entry = bigrams.get(bigram_text(code))
+        if entry is not None and entry[0] >= BASELINE_MIN_BIGRAM_COUNT and entry[2] > 0:
+            means[i] = entry[1]
+            deviations[i] = math.sqrt(entry[2] / (entry[0] - 1))
+    known = deviations[groups] > 0
+    if known.sum() < 10:
+        return 0.0
+    x = np.log(np.maximum(intervals[clean][known], 0.001)) - session_pace(intervals)
+    z_scores = np.abs(x - means[groups][known]) / deviations[groups][known]
+    return float(np.clip((np.median(z_scores) - 1.0) / 1.0, 0, 1))
+
+
+def evaluate_anticheat(samples, thresholds=(0.3, 0.5, 0.7, 0.9)):
+    """
+    Offline evaluation of anticheat_risk() on labelled sessions. samples
+    yields dicts with "intervals", "label" (1 = machine) and optionally
+    "text", "positions" and "wrong_keys". Returns precision/recall per threshold, the
+    ROC AUC and the mean scoring time per session.
+    """
+    risks, labels = [], []
+    elapsed = 0.0
+    for sample in samples:
+        started = time.perf_counter()
+        risk, _ = anticheat_risk(sample["intervals"], sample.get("text"), wrong_keys=sample.get("wrong_keys"),
+                                 positions=sample.get("positions"))
+        elapsed += time.perf_counter() - started
+        risks.append(risk)
+        labels.append(bool(sample["label"]))
+
+    risks = np.asarray(risks)
+    labels = np.asarray(labels)
+    report = {"sessions": len(risks), "machines": int(labels.sum()), "thresholds": []}
+    if not len(risks):
+        return report
+    report["us_per_session"] = elapsed / len(risks) * 1e6
+
+    for threshold in thresholds:
+        flagged = risks >= threshold
+        true_positives = int((flagged & labels).sum())
+        report["thresholds"].append({
+            "threshold": threshold,
+            "precision": true_positives / flagged.sum() if flagged.any() else 1.0,
+            "recall": true_positives / labels.sum() if labels.any() else 1.0,
+            "false_positive_rate": int((flagged & ~labels).sum()) / (~labels).sum() if (~labels).any() else 0.0,
+        })
+
+    # AUC = chance that a random machine session outranks a random human one (ties count half)
+    if labels.any() and (~labels).any():
+        order = np.argsort(risks, kind="mergesort")
+        ranks = np.empty(len(risks))
+        ranks[order] = np.arange(1, len(risks) + 1)
+        for value in np.unique(risks):
+            tied = risks == value
+            ranks[tied] = ranks[tied].mean()
+        machines = labels.sum()
+        report["roc_auc"] = (ranks[labels].sum() - machines * (machines + 1) / 2) / (machines * (~labels).sum())
+    return report
+
+
+def print_anticheat_report(report):
+    print(f"Sessions: {report['sessions']} ({report['machines']} machine)")
+    if "us_per_session" in report:
+        print(f"Scoring cost: {report['us_per_session']:.1f} us per session")
+    if "roc_auc" in report:
+        print(f"ROC AUC: {report['roc_auc']:.3f}")
+    for row in report["thresholds"]:
+        print(f"risk >= {row['threshold']:.2f}: precision {row['precision']:.3f}, "
+              f"recall {row['recall']:.3f}, false positive rate {row['false_positive_rate']:.3f}")
+
+
+def load_anticheat_corpus(paths, include_local=False):
+    """
+    Reads labelled sessions from JSON lines files and, optionally, adds the
+    verified local sessions as human samples.
+    """
+    for path in paths:
+        with open(path, "r", encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    if include_local:
+        for intervals, text, positions in iter_verified_intervals():
+            yield {"intervals": intervals, "text": text, "positions": positions, "label": 0}
+
+
+def hmac_sha256(key, message):
+    return hmac.digest(key, message, "sha256").hex()
+
+
+def keyed_blake2b(key, message):
+    return hashlib.blake2b(message, key=key, digest_size=32).hexdigest()
+
+
+SIGNING_ALGORITHMS = {
+    "sha256": hmac_sha256,
+    "blake2b": keyed_blake2b,
+}
+
+
+def compute_hmac(lines, algorithm=None, key_id=None):
+    """
+    Keyed hash over concatenated lines with one of SIGNING_ALGORITHMS
+    (SIGNING_ALGORITHM and SIGNING_KEY_ID by default). Returns the
+    "algorithm:key ID:hex digest" value of an HMAC line.
+    """
+    algorithm = algorithm or SIGNING_ALGORITHM
+    key_id = key_id or SIGNING_KEY_ID
+    message = "\n".join(lines).encode('utf-8')
+    return f"{algorithm}:{key_id}:{SIGNING_ALGORITHMS[algorithm](SIGNING_KEYS[key_id], message)}"
+
+
+def parse_signature(hmac_value):
+    """
+    Splits an HMAC line value into (algorithm, key ID, hex digest).
+    Values without IDs are from files signed before keys could rotate.
+    """
+    parts = hmac_value.split(":")
+    if len(parts) == 1:
+        return LEGACY_SIGNATURE + (hmac_value,)
+    if len(parts) == 3:
+        return tuple(parts)
+    return None
+
+
+def verify_hmac(filepath):
+    """
+    Verify that the HMAC line in stats[timestamp].txt matches the content.
+    Returns True if valid or not cheat file, False if tampered or missing.
+    """
+    try:
+        with open(filepath, "r", encoding='utf-8') as f:
+            return verify_session_lines(f.read().splitlines())
+    except Exception:
+        return False
+
+
+def verify_session_lines(lines):
+    """
+    HMAC check on the lines of a session file, wherever they came from.
+    The file names its algorithm and key, so each file costs one hash with
+    the algorithm it was signed with.
+    """
+    try:
+        # Locate HMAC line
+        hmac_line = None
+        for line in reversed(lines):
+            if line.startswith("HMAC: "):
+                hmac_line = line
+                break
+
+        if hmac_line is None:
+            return False  # No HMAC line means invalid
+
+        hmac_value = hmac_line[len("HMAC: "):].strip()
+        if hmac_value == "INVALID":
+            return False  # invalid cheat file
+
+        signature = parse_signature(hmac_value)
+        if signature is None:
+            return False
+        algorithm, key_id, digest = signature
+        if algorithm not in SIGNING_ALGORITHMS or key_id not in SIGNING_KEYS:
+            return False  # unknown algorithm or retired key
+
+        idx = lines.index(hmac_line)
+        message = "\n".join(lines[:idx]).encode('utf-8')
+        calc_hmac = SIGNING_ALGORITHMS[algorithm](SIGNING_KEYS[key_id], message)
+        return hmac.compare_digest(calc_hmac, digest)
+    except Exception:
+        return False
+
+
+def list_session_files():
+    """
+    Names of the individual session files in STATS_FOLDER, oldest first.
+    Sessions compacted into segment files are not listed (see
+    archive_listing()).
+    """
+    if not os.path.isdir(STATS_FOLDER):
+        return []
+    return sorted(entry for entry in os.listdir(STATS_FOLDER)
+                  if entry.startswith("stats") and entry.endswith(".txt") and entry != "stats.txt")
+
+
+# One run, from a session file or a stats.txt summary row of any version.
+# Fields a format does not have are None; verified is None for unsigned formats.
+StatsRecord = namedtuple("StatsRecord", ["source", "format", "timestamp", "wpm", "accuracy", "elapsed", "avg_time",
+                                         "sentence", "intervals", "cheat", "verified", "passage", "key_events"],
+                         defaults=(None, None))
+
+
+def verify_ver11_lines(lines, digest):
+    # ver10_hashes and ver11 signed only WPM, Accuracy, Timestamp, Avg Time and Sentence
+    algorithm, key_id = LEGACY_SIGNATURE
+    message = "\n".join(lines[:5]).encode('utf-8')
+    return hmac.compare_digest(SIGNING_ALGORITHMS[algorithm](SIGNING_KEYS[key_id], message), digest.strip())
+
+
+def parse_session_lines(source, lines, payload=True, decode_intervals=True):
+    """
+    StatsRecord from the lines of a session file of any version, sniffed
+    from the lines it has:
+      ver1-9  WPM, Accuracy, Timestamp and maybe timings, unsigned
+      ver10   the same plus Sentence, unsigned
+      ver11   HMAC over the first five lines (ver10_hashes and ver11)
+      ver12   HMAC over every line above it, schema 1 or 2
+    Cheat files of every version give a record with cheat=True and no
+    results. With payload=False a schema 2 file is read from its header
+    only (no sentence or intervals), and with decode_intervals=False its
+    intervals stay encoded (see decode_session()). Returns None when the
+    lines are none of these.
+    """
+    if lines and lines[0].startswith("Schema: "):
+        try:
+            session = decode_session(lines, decode_intervals) if payload else decode_session_header(lines)
+        except (KeyError, ValueError):
+            return None
+        if "timestamp" not in session or "wpm" not in session or "accuracy" not in session:
+            return None
+        return StatsRecord(source, "ver12", session["timestamp"], session["wpm"], session["accuracy"],
+                           session.get("elapsed"), session.get("avg_time"), session.get("sentence"),
+                           session.get("intervals"), False, verify_session_lines(lines), session.get("passage"),
+                           session.get("key_events"))
+
+    fields = {}
+    for line in lines:
+        key, sep, value = line.partition(": ")
+        if sep and key not in fields:
+            fields[key] = value
+    hmac_value = fields.get("HMAC")
+
+    if lines and lines[0] == "CHEAT DETECTED":
+        if hmac_value is None:
+            file_format = "ver10" if "Sentence" in fields else "ver1-9"
+        else:
+            file_format = "ver12" if "Prev" in fields else "ver11"
+        timestamp = os.path.basename(source)[len("stats"):-len(".txt")]
+        return StatsRecord(source, file_format, timestamp, None, None, None, None,
+                           fields.get("Sentence"), None, True, None)
+
+    try:
+        wpm = float(fields["WPM"])
+        accuracy = float(fields["Accuracy"].rstrip("%"))
+        timestamp = fields["Timestamp"]
+        avg_time = fields.get("Avg Time Between Letters")
+        avg_time = float(avg_time.split()[0]) if avg_time is not None else None
+        intervals = fields.get("Time Between Letters (s)")
+        intervals = np.array(intervals.split(", "), dtype=float) if intervals else None
+    except (KeyError, ValueError):
+        return None
+
+    if hmac_value is None:
+        file_format = "ver10" if "Sentence" in fields else "ver1-9"
+        verified = None
+    elif ":" in hmac_value:
+        file_format, verified = "ver12", verify_session_lines(lines)
+    else:
+        # A bare HMAC-SHA256: ver11 has five signed lines, timings and the HMAC; ver12 signed everything
+        file_format = "ver11" if len(lines) <= 7 else "ver12"
+        verified = verify_session_lines(lines) or (len(lines) == 7 and verify_ver11_lines(lines, hmac_value))
+
+    sentence = fields.get("Sentence")
+    return StatsRecord(source, file_format, timestamp, wpm, accuracy, None, avg_time,
+                       sentence, intervals, False, verified, passage_id(sentence) if sentence is not None else None,
+                       legacy_key_events(fields.get("Key Events (kind code point + ns)")))
+
+
+def is_summary_line(line):
+    # stats.txt rows of every version start with "yyyymmdd_hhmmss, "
+    return len(line) > 17 and line[8] == "_" and line[15:17] == ", " and line[:8].isdigit()
+
+
+def parse_summary_line(source, line):
+    """
+    StatsRecord from one stats.txt row. Rows are
+    "<timestamp>, WPM: x, Time: xs, Accuracy: x%, AvgTimeBetweenLetters: xs"
+    with "CHEAT DETECTED" as second field in cheat rows (ver9-10_hashes)
+    and ", Sentence: ..." at the end in ver10. ver11 and later write
+    Time: 0.00s for an unknown time, which becomes None.
+    """
+    parts = line.rstrip("\n").split(", ")
+    cheat = len(parts) > 1 and parts[1] == "CHEAT DETECTED"
+    values = parts[2:] if cheat else parts[1:]
+    if len(values) < 4:
+        return None
+    sentence = None
+    if len(values) > 4 and values[4].startswith("Sentence: "):
+        sentence = ", ".join(values[4:])[len("Sentence: "):]  # sentences may contain ", " themselves
+    file_format = "ver10 summary" if sentence is not None else "summary"
+    if cheat:
+        return StatsRecord(source, file_format, parts[0], None, None, None, None, sentence, None, True, None)
+    try:
+        wpm = float(values[0].partition(": ")[2])
+        elapsed = float(values[1].partition(": ")[2].rstrip("s"))
+        accuracy = float(values[2].partition(": ")[2].rstrip("%"))
+        avg_time = float(values[3].partition(": ")[2].rstrip("s"))
+    except ValueError:
+        return None
+    return StatsRecord(source, file_format, parts[0], wpm, accuracy, elapsed or None, avg_time,
+                       sentence, None, False, None)
+
+
+def iter_stats_records(paths):
+    """
+    Streams StatsRecords from any mix of stats.txt files and session files
+    of every version, in one pass and one file at a time; whether a file
+    is a summary is sniffed from its first line. Directories are read in
+    name order (stats*.txt and the score*.txt files of ver1-8), after the
+    sessions compacted into their segments folder. A stats
+    folder holds both the sessions and the stats.txt made from them, so
+    callers pick the records they want by format.
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            # Compacted sessions are older than the files left in the folder
+            for segment in list_segments(os.path.join(path, "segments")):
+                for name, content in iter_segment_sessions(segment):
+                    record = parse_session_lines(os.path.join(path, name),
+                                                 content.decode('utf-8', errors='replace').splitlines())
+                    if record is not None:
+                        yield record
+            names = sorted(name for name in os.listdir(path)
+                           if name.endswith(".txt") and name.startswith(("stats", "score")))
+            yield from iter_stats_records(os.path.join(path, name) for name in names)
+            continue
+        with open(path, "r", encoding='utf-8', errors='replace') as f:
+            first = f.readline()
+            if is_summary_line(first) or os.path.basename(path) == "stats.txt":
+                for line in itertools.chain((first,), f):
+                    record = parse_summary_line(path, line)
+                    if record is not None:
+                        yield record
+            else:
+                record = parse_session_lines(path, (first + f.read()).splitlines())
+                if record is not None:
+                    yield record
+
+
+def iter_verified_intervals(max_sessions=None):
+    """
+    Yields (intervals, sentence, positions) for verified session files,
+    newest first, positions being EventLog.pair_positions() of the signed
+    key events (None for files from before key events were recorded).
+    Only ver12 files sign their timings, so older files are skipped, and
+    so are segments without a verified session.
+    """
+    found = 0
+    segments, loose = archive_listing()
+    for name, content in iter_archive(segments, loose, reverse=True,
+                                      keep_segment=lambda summary: summary["verified"] > 0):
+        if max_sessions is not None and found >= max_sessions:
+            return
+        record = parse_session_lines(os.path.join(STATS_FOLDER, name),
+                                     content.decode('utf-8', errors='replace').splitlines())
+        if record is not None and record.format == "ver12" and record.verified and record.intervals is not None:
+            found += 1
+            positions = EventLog.decode(record.key_events).pair_positions() if record.key_events else None
+            yield record.intervals.tolist(), record.sentence, positions
+
+
+def parse_timestamp(timestamp):
+    # Session timestamps are "yyyymmdd_hhmmss"; None for anything else
+    if timestamp is None or len(timestamp) != 15 or timestamp[8] != "_":
+        return None
+    try:
+        return datetime.datetime(int(timestamp[:4]), int(timestamp[4:6]), int(timestamp[6:8]),
+                                 int(timestamp[9:11]), int(timestamp[11:13]), int(timestamp[13:]))
+    except ValueError:
+        return None
+
+
+def list_segments(folder=SEGMENTS_FOLDER):
+    """
+    Paths of the segment files in folder, oldest first. A segment is named
+    after its first session, and segments never overlap.
+    """
+    if not os.path.isdir(folder):
+        return []
+    return [os.path.join(folder, entry) for entry in sorted(os.listdir(folder)) if entry.endswith(".seg")]
+
+
+def read_segment_summary(path):
+    # The summary is the first line, so a scan can decide to skip a segment without reading the rest
+    with open(path, "r", encoding='utf-8') as f:
+        return json.loads(f.readline())
+
+
+def read_segment(path, columns):
+    """
+    Summary and the requested columns of a segment file. Each column is
+    one JSON line after the summary, in the order the summary lists them,
+    so columns that are not asked for are never decoded. The content
+    column is split back into the original file contents.
+    """
+    columns = set(columns)
+    if "content" in columns:
+        columns.add("size")
+    values = {}
+    with open(path, "r", encoding='utf-8') as f:
+        summary = json.loads(f.readline())
+        for column, line in zip(summary["columns"], f):
+            if column in columns:
+                values[column] = json.loads(line)
+    if "content" in values:
+        blob = zlib.decompress(base64.b64decode(values["content"]))
+        ends = list(itertools.accumulate(values["size"]))
+        values["content"] = [blob[end - size:end] for end, size in zip(ends, values["size"])]
+    return summary, values
+
+
+def iter_segment_sessions(path, reverse=False):
+    # (name, content) of every session in one segment, in name order
+    _, values = read_segment(path, ("name", "content"))
+    sessions = zip(values["name"], values["content"])
+    return reversed(list(sessions)) if reverse else sessions
+
+
+def archive_listing():
+    """
+    The session archive as stored: (segments, loose), the (path, summary)
+    of every segment file and the names of the session files not
+    compacted yet, both oldest first. Only segment summaries are read.
+    """
+    return [(path, read_segment_summary(path)) for path in list_segments()], list_session_files()
+
+
+def archive_size(segments, loose):
+    return sum(summary["sessions"] for _, summary in segments) + len(loose)
+
+
+def archive_contains(segments, loose, name):
+    position = bisect_left(loose, name)
+    if position < len(loose) and loose[position] == name:
+        return True
+    for path, summary in segments:
+        if summary["first"] <= name <= summary["last"]:
+            return name in read_segment(path, ("name",))[1]["name"]
+    return False
+
+
+def iter_archive(segments, loose, after=None, reverse=False, keep_segment=None):
+    """
+    (name, content) of every session in the archive in name order, or
+    newest first with reverse=True, whether compacted or not. Sessions up
+    to after are skipped, and so are segments keep_segment(summary)
+    rejects; either way a skipped segment is decided on its summary and
+    never read.
+    """
+    def compacted():
+        for path, summary in (reversed(segments) if reverse else segments):
+            if after is not None and summary["last"] <= after:
+                continue
+            if keep_segment is not None and not keep_segment(summary):
+                continue
+            for name, content in iter_segment_sessions(path, reverse):
+                if after is None or name > after:
+                    yield name, content
+
+    def files():
+        start = 0 if after is None else bisect_right(loose, after)
+        for name in (reversed(loose[start:]) if reverse else loose[start:]):
+            with open(os.path.join(STATS_FOLDER, name), "rb") as f:
+                yield name, f.read()
+
+    return heapq.merge(compacted(), files(), key=lambda session: session[0], reverse=reverse)
+
+
+def iter_archive_records(payload=True, keep_segment=None, decode_intervals=True):
+    """
+    StatsRecords of every session in the archive, loose or compacted,
+    oldest first, parsed one at a time.
+    """
+    segments, loose = archive_listing()
+    for name, content in iter_archive(segments, loose, keep_segment=keep_segment):
+        record = parse_session_lines(os.path.join(STATS_FOLDER, name),
+                                     content.decode('utf-8', errors='replace').splitlines(), payload,
+                                     decode_intervals)
+        if record is not None:
+            yield record
+
+
+# Filters of a stats query; None (or False) means no filter. since and until
+# are "yyyymmdd_hhmmss" timestamps, both inclusive; passages is a set of IDs.
+StatsQuery = namedtuple("StatsQuery", ["since", "until", "passages", "min_wpm", "exclude_flagged"],
+                        defaults=(None, None, None, None, False))
+
+
+def query_matches(query, record):
+    if query.since is not None and (record.timestamp is None or record.timestamp < query.since):
+        return False
+    if query.until is not None and (record.timestamp is None or record.timestamp > query.until):
+        return False
+    if query.passages is not None and record.passage not in query.passages:
+        return False
+    if query.min_wpm is not None and (record.wpm is None or record.wpm < query.min_wpm):
+        return False
+    return not (query.exclude_flagged and (record.cheat or record.verified is False))
+
+
+def query_may_match_segment(query, summary):
+    """
+    False when a segment's summary rules out every session in it, so the
+    segment is skipped without reading its columns.
+    """
+    if query.since is not None and summary["last_timestamp"] < query.since:
+        return False
+    if query.until is not None and summary["first_timestamp"] > query.until:
+        return False
+    if query.passages is not None and "passages" in summary and query.passages.isdisjoint(summary["passages"]):
+        return False
+    if query.min_wpm is not None and (summary["wpm_max"] is None or summary["wpm_max"] < query.min_wpm):
+        return False
+    return not (query.exclude_flagged and summary["verified"] == 0)
+
+
+def iter_query_records(query):
+    """
+    StatsRecords of the sessions matching query, oldest first, without
+    payloads. Segments are the index: their summaries rule out whole
+    segments, and the rows of the rest come from the parsed columns
+    without decompressing a session. Loose files outside the date range
+    are skipped by name, the others are read up to their header.
+    """
+    segments, loose = archive_listing()
+    for path, summary in segments:
+        if not query_may_match_segment(query, summary):
+            continue
+        columns = [column for column in summary["columns"] if column not in ("content", "leaf", "prev", "size")]
+        _, values = read_segment(path, columns)
+        for row in zip(*(values[column] for column in columns)):
+            fields = dict(zip(columns, row))
+            record = StatsRecord(os.path.join(STATS_FOLDER, fields["name"]), fields.get("format"), fields["timestamp"],
+                                 fields["wpm"], fields["accuracy"], fields["elapsed"], fields["avg_time"], None, None,
+                                 fields["cheat"], fields["verified"], fields["passage"])
+            if query_matches(query, record):
+                yield record
+
+    first = 0 if query.since is None else bisect_left(loose, f"stats{query.since}")
+    last = len(loose) if query.until is None else bisect_right(loose, f"stats{query.until}.txt")
+    for name in loose[first:last]:
+        with open(os.path.join(STATS_FOLDER, name), "r", encoding='utf-8', errors='replace') as f:
+            record = parse_session_lines(os.path.join(STATS_FOLDER, name), f.read().splitlines(), payload=False)
+        if record is not None and query_matches(query, record):
+            yield record
+
+
+def stats_rows(records):
+    # One output row per record, with the sentence looked up in the passage table when the file only names it
+    for record in records:
+        sentence = record.sentence
+        if sentence is None and record.passage is not None:
+            sentence = resolve_passage(record.passage)
+        yield (os.path.basename(record.source), record.format, record.timestamp, record.wpm, record.accuracy,
+               record.elapsed, record.avg_time, record.passage, sentence, record.cheat, record.verified)
+
+
+def write_segment(names, path):
+    """
+    Writes the session files names (oldest first) into one segment file.
+    Every file's bytes are kept as they are, zlib-compressed in the
+    content column, so their HMACs, chain hashes and Merkle leaves stay
+    valid; the other columns hold the parsed results for scans that need
+    no payload. Returns the summary.
+    """
+    columns = {column: [] for column in SEGMENT_COLUMNS if column != "content"}
+    contents = []
+    for name in names:
+        with open(os.path.join(STATS_FOLDER, name), "rb") as f:
+            content = f.read()
+        lines = content.decode('utf-8', errors='replace').splitlines()
+        record = parse_session_lines(os.path.join(STATS_FOLDER, name), lines, payload=False)
+        prev_line = next((line for line in lines if line.startswith("Prev: ")), None)
+        contents.append(content)
+        columns["name"].append(name)
+        columns["size"].append(len(content))
+        columns["leaf"].append(merkle_leaf(name, content))
+        columns["prev"].append(prev_line[len("Prev: "):] if prev_line is not None else None)
+        for field in ("format", "timestamp", "wpm", "accuracy", "elapsed", "avg_time", "passage", "cheat", "verified"):
+            columns[field].append(getattr(record, field) if record is not None else None)
+
+    wpms = [wpm for wpm in columns["wpm"] if wpm is not None]
+    summary = {
+        "sessions": len(names),
+        "first": names[0],
+        "last": names[-1],
+        "first_timestamp": names[0][len("stats"):-len(".txt")],
+        "last_timestamp": names[-1][len("stats"):-len(".txt")],
+        "wpm_min": min(wpms, default=None),
+        "wpm_max": max(wpms, default=None),
+        "verified": sum(1 for verified in columns["verified"] if verified),
+        "cheat": sum(1 for cheat in columns["cheat"] if cheat),
+        "passages": sorted(set(passage for passage in columns["passage"] if passage is not None)),
+        "hash": columns["leaf"][-1],
+        "columns": list(SEGMENT_COLUMNS),
+    }
+    columns["content"] = base64.b64encode(zlib.compress(b"".join(contents), 9)).decode('ascii')
+    with open(path + ".tmp", "w", encoding='utf-8') as f:
+        f.write(json.dumps(summary) + "\n")
+        for column in SEGMENT_COLUMNS:
+            f.write(json.dumps(columns[column], separators=(",", ":")) + "\n")
+    os.replace(path + ".tmp", path)
+    return summary
+
+
+def compact_archive(days=COMPACT_AFTER_DAYS, max_sessions=SEGMENT_MAX_SESSIONS):
+    """
+    Folds the session files older than days into immutable segment files
+    of at most max_sessions sessions, then deletes them, so the stats
+    folder holds recent sessions and a few segments however long the
+    history grows. Only sessions newer than every segment are folded, so
+    segments never overlap. Returns the number of sessions compacted.
+    """
+    rebuild_cumulative_stats()  # bring the chain checkpoint up to date so it survives compaction
+    cutoff = (datetime.datetime.now() - datetime.timedelta(days=days)).strftime("stats%Y%m%d_%H%M%S.txt")
+    segments, loose = archive_listing()
+    start = bisect_right(loose, segments[-1][1]["last"]) if segments else 0
+    old = loose[start:bisect_left(loose, cutoff)]
+    if not old:
+        return 0
+    checkpoint = load_chain_checkpoint()
+    checkpoint_held = checkpoint_still_holds(checkpoint, segments, loose, load_merkle_frontier())
+
+    os.makedirs(SEGMENTS_FOLDER, exist_ok=True)
+    for first in range(0, len(old), max_sessions):
+        batch = old[first:first + max_sessions]
+        write_segment(batch, os.path.join(SEGMENTS_FOLDER, batch[0][:-len(".txt")] + ".seg"))
+        for name in batch:
+            os.remove(os.path.join(STATS_FOLDER, name))
+
+    if checkpoint_held:
+        # Same sessions, new files: only the listing fingerprint changes
+        segments, loose = archive_listing()
+        checkpoint["listing"] = listing_fingerprint(segments, loose[:bisect_right(loose, checkpoint["name"])])
+        save_chain_checkpoint(checkpoint)
+    return len(old)
+
+
+def load_chain_checkpoint():
+    try:
+        with open(CHAIN_CHECKPOINT_FILE, "r", encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        return checkpoint if "merkle" in checkpoint and "listing" in checkpoint else None
+    except (OSError, ValueError):
+        return None
+
+
+def save_chain_checkpoint(checkpoint):
+    tmp_filename = CHAIN_CHECKPOINT_FILE + ".tmp"
+    with open(tmp_filename, "w", encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_filename, CHAIN_CHECKPOINT_FILE)
+
+
+def listing_fingerprint(segments, names):
+    """
+    Digest of the archive as listed: every segment by its name and summary
+    hash, every session file by its name and inode. os.scandir() returns
+    inode numbers with the names, so on POSIX no file is stat'ed or
+    opened, yet deleting, adding or renaming files onto each other
+    changes it.
+    """
+    wanted = set(names)
+    inodes = {entry.name: entry.inode() for entry in os.scandir(STATS_FOLDER) if entry.name in wanted}
+    digest = hashlib.sha256()
+    for path, summary in segments:
+        digest.update(f"{os.path.basename(path)} {summary['hash']}\n".encode('utf-8'))
+    for name in names:
+        digest.update(f"{name} {inodes.get(name)}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def checkpoint_still_holds(checkpoint, segments, loose, frontier):
+    """
+    True when the files up to the checkpoint are still the ones verified
+    last time: as many of them under the same names and inodes (see
+    listing_fingerprint()), the checkpoint session unchanged, and the
+    Merkle index only appended to since (see merkle_extends()), none of
+    which stats or reads the older files. Segments count by their
+    summaries. Otherwise everything is verified again, and a deleted,
+    reordered or replaced file breaks the chain there. A file edited in
+    place by hand is left to "audit --rehash" and "audit --chain".
+    """
+    if checkpoint is None or not os.path.isfile(os.path.join(STATS_FOLDER, "stats.txt")):
+        return False
+    if segments and segments[-1][1]["last"] > checkpoint["name"]:
+        return False
+    position = bisect_right(loose, checkpoint["name"])
+    if archive_size(segments, loose[:position]) != checkpoint["files"]:
+        return False
+    if listing_fingerprint(segments, loose[:position]) != checkpoint["listing"]:
+        return False
+    if not merkle_extends(checkpoint["merkle"], frontier):
+        return False
+    if not position:
+        # The checkpoint session was compacted: the segment summary holds its hash
+        return bool(segments) and segments[-1][1]["last"] == checkpoint["name"] \
+            and segments[-1][1]["hash"] == checkpoint["hash"]
+    if loose[position - 1] != checkpoint["name"]:
+        return False
+    with open(os.path.join(STATS_FOLDER, checkpoint["name"]), "rb") as f:
+        return merkle_leaf(checkpoint["name"], f.read()) == checkpoint["hash"]
+
+
+def rebuild_cumulative_stats(full=False):
+    """
+    Brings stats.txt up to date with the session files. Only files saved
+    after the chain checkpoint are read: each one's HMAC is verified and
+    its "Prev:" line must hold the hash of the file before it, so a
+    deleted, reordered or replaced session shows up as a broken link.
+    full=True (or a checkpoint that no longer matches the folder) verifies
+    every file again and writes a fresh stats.txt. Returns the names of
+    files whose link to the previous file is broken.
+    """
+    os.makedirs(STATS_FOLDER, exist_ok=True)
+    stats_filename = os.path.join(STATS_FOLDER, "stats.txt")
+    segments, loose = archive_listing()
+    checkpoint = load_chain_checkpoint()
+    frontier = load_merkle_frontier()
+
+    if not full and checkpoint_still_holds(checkpoint, segments, loose, frontier):
+        after = checkpoint["name"]
+        previous_hash = checkpoint["hash"]
+        chained = checkpoint["chained"]
+        breaks = checkpoint["breaks"]
+        mode = "a"
+    else:
+        after = None
+        previous_hash = None
+        chained = False
+        breaks = []
+        mode = "w"
+        if checkpoint is not None and not archive_contains(segments, loose, checkpoint["name"]):
+            breaks.append(checkpoint["name"])  # the newest session has no successor to notice it is gone
+
+    valid_entries = []
+    last_entry = after
+    # Segments wholly before the checkpoint are skipped on their summary
+    for entry, content in iter_archive(segments, loose, after):
+        full_path = os.path.join(STATS_FOLDER, entry)
+        last_entry = entry
+        lines = content.decode('utf-8', errors='replace').splitlines()
+
+        prev_line = next((l for l in lines if l.startswith("Prev: ")), None)
+        if prev_line is not None:
+            # The first chained file may follow unchained ones from before the chain existed
+            expected = previous_hash or "none"
+            if prev_line[len("Prev: "):] != expected:
+                breaks.append(entry)
+            chained = True
+        elif chained:
+            breaks.append(entry)  # an unchained file inside the chain was put there by hand
+        previous_hash = merkle_leaf(entry, content)
+
+        record = parse_session_lines(full_path, lines, payload=False)
+        if record is not None and record.verified and record.avg_time is not None:
+            # Files from before schema 2 have no elapsed time; stats.txt keeps 0.00s for them
+            valid_entries.append((record.timestamp, record.wpm, record.elapsed or 0.0, record.accuracy, record.avg_time))
+
+    valid_entries.sort()
+
+    # Rollups saved for stats.txt as it is now (same size) can take the new runs as they are appended
+    rollups = load_rollups() if mode == "a" and os.path.isfile(stats_filename) else None
+    if rollups is not None and rollups.get("stats_size") != os.path.getsize(stats_filename):
+        rollups = None
+    appended = {metric: [] for metric in PLOT_METRICS}
+
+    # Append the new runs, or write a fresh cumulative stats.txt
+    with open(stats_filename, mode, encoding='utf-8') as sf:
+        for timestamp, wpm, t, acc, avg_t in valid_entries:
+            sf.write(f"{timestamp}, WPM: {wpm:.2f}, Time: {t:.2f}s, Accuracy: {acc:.2f}%, AvgTimeBetweenLetters: {avg_t:.3f}s\n")
+            # The values as stats.txt holds them, so folding gives what a rebuild from the file would
+            appended["wpm"].append(round(wpm, 2))
+            appended["time"].append(round(t, 2))
+            appended["accuracy"].append(round(acc, 2))
+            appended["avg_time"].append(round(avg_t, 3))
+
+    if last_entry is not None:
+        merkle = {key: frontier[key] for key in ("sessions", "peaks", "last", "log_size")}
+        save_chain_checkpoint({"name": last_entry, "hash": previous_hash, "files": archive_size(segments, loose),
+                               "listing": listing_fingerprint(segments, loose), "merkle": merkle,
+                               "chained": chained, "breaks": breaks})
+    if breaks:
+        print(f"{Colors.RED}Warning: the session log chain is broken at {', '.join(breaks)}: "
+              f"sessions were deleted, reordered or replaced.{Colors.RESET}")
+
+    # Keep the plotting rollups next to stats.txt so charts never need the full history
+    if rollups is not None:
+        fold_rollups(rollups, appended)
+    else:
+        rollups = build_rollups(load_stats_series())
+    rollups["stats_size"] = os.path.getsize(stats_filename)
+    save_rollups(rollups)
+    return breaks
+
+
+def merkle_leaf(name, content):
+    # Leaves and inner nodes are hashed with different prefixes, so one can never pass for the other
+    return hashlib.sha256(b"\x00" + name.encode('utf-8') + b"\x00" + content).hexdigest()
+
+
+def merkle_parent(left, right):
+    return hashlib.sha256(b"\x01" + bytes.fromhex(left) + bytes.fromhex(right)).hexdigest()
+
+
+def build_merkle_levels(leaves):
+    """
+    All levels of the Merkle tree over leaves, leaves first, root last.
+    An odd node at the end of a level moves up unchanged.
+    """
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        below = levels[-1]
+        above = [merkle_parent(below[i], below[i + 1]) for i in range(0, len(below) - 1, 2)]
+        if len(below) % 2:
+            above.append(below[-1])
+        levels.append(above)
+    return levels
+
+
+def merkle_push(peaks, count, leaf):
+    # Appends a leaf to the peaks of a count-leaf tree: one hash per perfect subtree it completes
+    node = leaf
+    while count & 1:
+        node = merkle_parent(peaks.pop(), node)
+        count >>= 1
+    peaks.append(node)
+
+
+def merkle_peaks(leaves):
+    # Roots of the perfect subtrees a tree over leaves is made of, largest (leftmost) first
+    peaks = []
+    for count, leaf in enumerate(leaves):
+        merkle_push(peaks, count, leaf)
+    return peaks
+
+
+def merkle_peaks_root(peaks):
+    """
+    Root of a tree from its peaks. An odd node moves up unchanged in
+    build_merkle_levels(), so the root is the peaks folded together from
+    the smallest (rightmost) one.
+    """
+    root = None
+    for peak in reversed(peaks):
+        root = peak if root is None else merkle_parent(peak, root)
+    return root
+
+
+def merkle_root(index):
+    return index["levels"][-1][0] if index["names"] else None
+
+
+def rebuild_merkle_index():
+    """
+    Hashes every session, loose or compacted, into a fresh index. Only
+    needed once, or to audit the files on disk against the stored index.
+    """
+    names = []
+    leaves = []
+    for name, content in iter_archive(*archive_listing()):
+        names.append(name)
+        leaves.append(merkle_leaf(name, content))
+    return {"names": names, "levels": build_merkle_levels(leaves)}
+
+
+def parse_merkle_log(data):
+    """
+    (names, leaves, size) of a leaf log, sorted by name. A later line for
+    the same name (a file saved again within the same second) replaces the
+    earlier one; size is where the last complete line ends, so a line cut
+    short by a crash is left out.
+    """
+    size = data.rfind(b"\n") + 1
+    leaves = {}
+    for line in data[:size].decode('utf-8', errors='replace').splitlines():
+        name, _, leaf = line.partition(" ")
+        if len(leaf) == 64:
+            leaves[name] = leaf
+    names = sorted(leaves)
+    return names, [leaves[name] for name in names], size
+
+
+def write_merkle_log(names, leaves):
+    os.makedirs(STATS_FOLDER, exist_ok=True)
+    data = "".join(f"{name} {leaf}\n" for name, leaf in zip(names, leaves)).encode('utf-8')
+    tmp_filename = MERKLE_LOG_FILE + ".tmp"
+    with open(tmp_filename, "wb") as f:
+        f.write(data)
+    os.replace(tmp_filename, MERKLE_LOG_FILE)
+    return len(data)
+
+
+def merkle_frontier(names, leaves, log_size):
+    return {"sessions": len(names), "peaks": merkle_peaks(leaves), "last": names[-1] if names else None,
+            "last_leaf": leaves[-1] if leaves else None, "log_size": log_size}
+
+
+def load_merkle_frontier():
+    """
+    The frontier of the archive's Merkle tree: enough to append a session
+    and compute the root without reading the leaf log. It is recomputed
+    from the log when the two disagree (a save interrupted between them),
+    converted from a merkle.json written before the leaf log existed, and
+    built by hashing every session when neither is there.
+    """
+    try:
+        with open(MERKLE_INDEX_FILE, "r", encoding='utf-8') as f:
+            frontier = json.load(f)
+        if "levels" in frontier:
+            # merkle.json used to hold every level of the tree
+            if len(frontier["names"]) != len(frontier["levels"][0]):
+                raise ValueError("index does not match its leaves")
+            names, leaves = frontier["names"], frontier["levels"][0]
+            frontier = merkle_frontier(names, leaves, write_merkle_log(names, leaves))
+            save_merkle_frontier(frontier)
+        if frontier["log_size"] == os.path.getsize(MERKLE_LOG_FILE):
+            return frontier
+    except (OSError, ValueError, KeyError, IndexError):
+        pass
+    try:
+        with open(MERKLE_LOG_FILE, "rb") as f:
+            names, leaves, size = parse_merkle_log(f.read())
+    except OSError:
+        index = rebuild_merkle_index()
+        names, leaves = index["names"], index["levels"][0]
+        size = write_merkle_log(names, leaves)
+    frontier = merkle_frontier(names, leaves, size)
+    save_merkle_frontier(frontier)
+    return frontier
+
+
+def save_merkle_frontier(frontier):
+    os.makedirs(STATS_FOLDER, exist_ok=True)
+    tmp_filename = MERKLE_INDEX_FILE + ".tmp"
+    with open(tmp_filename, "w", encoding='utf-8') as f:
+        json.dump(frontier, f, separators=(",", ":"))
+    os.replace(tmp_filename, MERKLE_INDEX_FILE)
+
+
+def merkle_append(frontier, name, leaf):
+    """
+    Adds one session file: a line appended to the leaf log and one hash
+    per perfect subtree it completes. Files arrive in name (timestamp)
+    order; a file saved again within the same second, or one that sorts
+    before the newest (clock set back), recomputes the peaks from the log.
+    """
+    line = f"{name} {leaf}\n".encode('utf-8')
+    with open(MERKLE_LOG_FILE, "ab") as f:
+        f.truncate(frontier["log_size"])  # drops a line a crash may have left half written
+        f.write(line)
+    if frontier["last"] is None or name > frontier["last"]:
+        merkle_push(frontier["peaks"], frontier["sessions"], leaf)
+        frontier.update(sessions=frontier["sessions"] + 1, last=name, last_leaf=leaf,
+                        log_size=frontier["log_size"] + len(line))
+    else:
+        with open(MERKLE_LOG_FILE, "rb") as f:
+            frontier.update(merkle_frontier(*parse_merkle_log(f.read())))
+
+
+def merkle_extends(earlier, frontier):
+    """
+    True when frontier describes the index that earlier (a copy of an
+    older frontier) described with only newer sessions appended: the log
+    lines added since are replayed onto the earlier peaks and must give
+    the current root. Costs one hash per subtree the new sessions
+    complete, however large the archive.
+    """
+    if frontier["log_size"] < earlier["log_size"]:
+        return False
+    with open(MERKLE_LOG_FILE, "rb") as f:
+        f.seek(earlier["log_size"])
+        added = f.read(frontier["log_size"] - earlier["log_size"]).decode('utf-8', errors='replace')
+    peaks = list(earlier["peaks"])
+    sessions = earlier["sessions"]
+    last = earlier["last"]
+    for line in added.splitlines():
+        name, _, leaf = line.partition(" ")
+        if len(leaf) != 64 or (last is not None and name <= last):
+            return False  # a file saved out of order: the older part of the tree changed
+        merkle_push(peaks, sessions, leaf)
+        sessions += 1
+        last = name
+    return sessions == frontier["sessions"] and merkle_peaks_root(peaks) == merkle_peaks_root(frontier["peaks"])
+
+
+def load_merkle_index(path=None):
+    """
+    The full index (names and every level of the tree) of a leaf log, or
+    of a merkle.json from before the leaf log. Defaults to this archive's
+    log, brought up to date with the frontier first. Reads every leaf, so
+    only audits need it.
+    """
+    if path is None:
+        load_merkle_frontier()
+        path = MERKLE_LOG_FILE
+    with open(path, "rb") as f:
+        data = f.read()
+    try:
+        index = json.loads(data)
+    except ValueError:
+        names, leaves, _ = parse_merkle_log(data)
+        return {"names": names, "levels": build_merkle_levels(leaves)}
+    if len(index["names"]) != len(index["levels"][0]):
+        raise ValueError("index does not match its leaves")
+    return index
+
+
+def merkle_diff_positions(levels_a, levels_b):
+    """
+    Leaf positions where two trees differ, found by walking down from the
+    roots into differing subtrees only. With k differences that is
+    O(k log N) node comparisons. Returns (positions, comparisons).
+    """
+    def node(levels, level, i):
+        if level < len(levels) and i < len(levels[level]):
+            return levels[level][i]
+        return None
+
+    positions = []
+    comparisons = 0
+    stack = [(max(len(levels_a), len(levels_b)) - 1, 0)]
+    while stack:
+        level, i = stack.pop()
+        a, b = node(levels_a, level, i), node(levels_b, level, i)
+        comparisons += 1
+        if a == b:
+            continue  # identical subtrees, or past the end of both
+        if level == 0:
+            positions.append(i)
+        else:
+            stack.extend([(level - 1, 2 * i + 1), (level - 1, 2 * i)])
+    return sorted(positions), comparisons
+
+
+def merkle_diff(index_a, index_b):
+    """
+    Sessions that differ between two indexes, as (changed, only_a, only_b,
+    comparisons). Leaves are matched by name: when both list the same
+    sessions the trees are walked down into differing subtrees only (see
+    merkle_diff_positions()); otherwise a session added or deleted on one
+    side would shift every later leaf, so the sorted name lists are merged
+    and the leaves of the sessions in both are compared one to one.
+    """
+    names_a, leaves_a = index_a["names"], index_a["levels"][0]
+    names_b, leaves_b = index_b["names"], index_b["levels"][0]
+    if names_a == names_b:
+        positions, comparisons = merkle_diff_positions(index_a["levels"], index_b["levels"])
+        return [names_a[position] for position in positions], [], [], comparisons
+
+    changed, only_a, only_b = [], [], []
+    i = j = comparisons = 0
+    while i < len(names_a) or j < len(names_b):
+        if j == len(names_b) or (i < len(names_a) and names_a[i] < names_b[j]):
+            only_a.append(names_a[i])
+            i += 1
+        elif i == len(names_a) or names_b[j] < names_a[i]:
+            only_b.append(names_b[j])
+            j += 1
+        else:
+            comparisons += 1
+            if leaves_a[i] != leaves_b[j]:
+                changed.append(names_a[i])
+            i += 1
+            j += 1
+    return changed, only_a, only_b, comparisons
+
+
+def audit_archive(args):
+    """
+    Compares the stored index with a reference: a root recorded elsewhere
+    (--root), another index such as a server's copy (--against) or the
+    files on disk hashed again (--rehash). Equal roots settle the whole
+    archive in one comparison; otherwise only differing subtrees are
+    opened to name the sessions that changed. --chain verifies every
+    session file and its hash chain link instead.
+    """
+    if args.chain:
+        sessions = archive_size(*archive_listing())
+        if not rebuild_cumulative_stats(full=True):
+            print(f"Session log chain intact over {sessions} sessions.")
+        return
+    frontier = load_merkle_frontier()
+    root = merkle_peaks_root(frontier["peaks"])
+    print(f"{frontier['sessions']} sessions, root {root}")
+    if args.root:
+        print("Archive matches the recorded root." if args.root == root else "Archive does NOT match the recorded root.")
+        return
+    if args.against:
+        reference = load_merkle_index(args.against)
+    elif args.rehash:
+        reference = rebuild_merkle_index()
+    else:
+        return
+
+    if merkle_root(reference) == root:
+        print("Archive matches the reference.")
+        return
+    changed, indexed_only, reference_only, comparisons = merkle_diff(load_merkle_index(), reference)
+    print(f"{len(changed) + len(indexed_only) + len(reference_only)} session(s) differ "
+          f"({comparisons} comparisons):")
+    for name in changed:
+        print(f"  {name}: changed")
+    for name in indexed_only:
+        print(f"  {name}: in the index only")
+    for name in reference_only:
+        print(f"  {name}: in the reference only")
+
+
+def new_aggregates():
+    return {
+        "runs": 0,
+        "best_wpm": 0.0,
+        "best_accuracy": 0.0,
+        "passage_best_wpm": {},
+        "ema_wpm": None,
+        "ema_accuracy": None,
+        "wpm_sketch": [0] * (WPM_SKETCH_BUCKETS + 1),
+    }
+
+
+def rebuild_aggregates():
+    """
+    Seeds a fresh aggregates cache from the verified runs in stats.txt.
+    Only needed once, when aggregates.json is missing or unreadable.
+    stats.txt carries no sentences, so per-sentence bests start empty.
+    """
+    aggregates = new_aggregates()
+    stats_filename = os.path.join(STATS_FOLDER, "stats.txt")
+    if not os.path.isfile(stats_filename):
+        return aggregates
+
+    for record in iter_stats_records([stats_filename]):
+        if not record.cheat:
+            update_aggregates(aggregates, record.wpm, record.accuracy, None)
+    return aggregates
+
+
+def load_aggregates():
+    try:
+        with open(AGGREGATES_FILE, "r", encoding='utf-8') as f:
+            aggregates = json.load(f)
+        if len(aggregates.get("wpm_sketch", [])) != WPM_SKETCH_BUCKETS + 1:
+            raise ValueError("sketch layout changed")
+        if "sentence_best_wpm" in aggregates:
+            # Older caches keyed personal bests by the full sentence text
+            aggregates["passage_best_wpm"] = {passage_id(sentence): wpm
+                                              for sentence, wpm in aggregates.pop("sentence_best_wpm").items()}
+        return aggregates
+    except (OSError, ValueError):
+        return rebuild_aggregates()
+
+
+def save_aggregates(aggregates):
+    os.makedirs(STATS_FOLDER, exist_ok=True)
+    tmp_filename = AGGREGATES_FILE + ".tmp"
+    with open(tmp_filename, "w", encoding='utf-8') as f:
+        json.dump(aggregates, f)
+    os.replace(tmp_filename, AGGREGATES_FILE)  # never leave a half written cache behind
+
+
+def trend_arrow(value, average):
+    if average is None:
+        return "-"
+    if value > average * (1 + TREND_TOLERANCE):
+        return "\u2191"
+    if value < average * (1 - TREND_TOLERANCE):
+        return "\u2193"
+    return "\u2192"
+
+
+def sketch_percentile(sketch, percent):
+    """
+    Approximate WPM percentile from the bucketed sketch (1 WPM resolution).
+    Cost depends only on the number of buckets, never on the number of runs.
+    """
+    total = sum(sketch)
+    if total == 0:
+        return 0.0
+    target = total * percent / 100
+    running = 0
+    for bucket, count in enumerate(sketch):
+        running += count
+        if running >= target:
+            return bucket + 0.5
+    return float(len(sketch) - 1)
+
+
+def update_aggregates(aggregates, wpm, accuracy, passage):
+    """
+    Folds one run into the aggregates in O(1) and returns what changed:
+    personal bests and trend arrows measured against the previous averages.
+    passage is the passage ID (see passage_id()) or None.
+    """
+    progress = {
+        "new_pb": wpm > aggregates["best_wpm"],
+        "new_accuracy_pb": accuracy > aggregates["best_accuracy"],
+        "new_sentence_pb": False,
+        "wpm_trend": trend_arrow(wpm, aggregates["ema_wpm"]),
+        "accuracy_trend": trend_arrow(accuracy, aggregates["ema_accuracy"]),
+    }
+
+    aggregates["runs"] += 1
+    aggregates["best_wpm"] = max(aggregates["best_wpm"], wpm)
+    aggregates["best_accuracy"] = max(aggregates["best_accuracy"], accuracy)
+
+    if passage is not None:
+        passage_bests = aggregates["passage_best_wpm"]
+        previous = passage_bests.get(passage)
+        progress["new_sentence_pb"] = previous is None or wpm > previous
+        if progress["new_sentence_pb"]:
+            passage_bests[passage] = wpm
+
+    if aggregates["ema_wpm"] is None:
+        aggregates["ema_wpm"] = wpm
+        aggregates["ema_accuracy"] = accuracy
+    else:
+        aggregates["ema_wpm"] += EMA_ALPHA * (wpm - aggregates["ema_wpm"])
+        aggregates["ema_accuracy"] += EMA_ALPHA * (accuracy - aggregates["ema_accuracy"])
+
+    bucket = min(int(wpm), WPM_SKETCH_BUCKETS)
+    aggregates["wpm_sketch"][max(bucket, 0)] += 1
+
+    progress["ema_wpm"] = aggregates["ema_wpm"]
+    progress["ema_accuracy"] = aggregates["ema_accuracy"]
+    progress["p50_wpm"] = sketch_percentile(aggregates["wpm_sketch"], 50)
+    progress["p90_wpm"] = sketch_percentile(aggregates["wpm_sketch"], 90)
+    return progress
+
+
+def passage_id(text):
+    # Content-addressed: the same passage gets the same ID on every machine
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def intern_passage(text):
+    """
+    Stores text in the passage table once and returns its ID. The file
+    name is the ID, so storing the same passage again is a no-op.
+    """
+    pid = passage_id(text)
+    filename = os.path.join(PASSAGES_FOLDER, f"{pid}.txt")
+    if not os.path.isfile(filename):
+        os.makedirs(PASSAGES_FOLDER, exist_ok=True)
+        with open(filename + ".tmp", "w", encoding='utf-8') as f:
+            f.write(text)
+        os.replace(filename + ".tmp", filename)
+    return pid
+
+
+@functools.lru_cache(maxsize=PASSAGE_CACHE_SIZE)
+def resolve_passage(pid):
+    """
+    Text of a passage ID from the passage table, or None when it is not
+    there or its content no longer hashes to the ID. Cached, so readers
+    going through many sessions of the same passages read each file once.
+    """
+    try:
+        with open(os.path.join(PASSAGES_FOLDER, f"{pid}.txt"), "r", encoding='utf-8') as f:
+            text = f.read()
+    except OSError:
+        return None
+    return text if passage_id(text) == pid else None
+
+
+def encode_intervals_text(intervals):
+    return ", ".join(f"{t:.3f}" for t in intervals)
+
+
+def decode_intervals_text(encoded):
+    return np.array(encoded.split(", "), dtype=float)
+
+
+def encode_varints(values):
+    """
+    Unsigned LEB128 varints of a uint64 array: 7 bits per byte, high bit
+    set on every byte but the last of a value. Built one byte position at
+    a time with numpy, so the Python loop runs at most 10 times.
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        sizes += rest > 0
+        rest >>= np.uint64(7)
+    starts = np.cumsum(sizes) - sizes
+    out = np.empty(int(sizes.sum()), dtype=np.uint8)
+    rest = values.copy()
+    for position in range(int(sizes.max()) if len(sizes) else 0):
+        active = sizes > position
+        more = (sizes[active] > position + 1).astype(np.uint8) << 7
+        out[starts[active] + position] = (rest[active] & np.uint64(0x7F)).astype(np.uint8) | more
+        rest >>= np.uint64(7)
+    return out.tobytes()
+
+
+def decode_varints(data):
+    """
+    Inverse of encode_varints(). Every byte below 0x80 ends a value, so
+    the values are found in one pass and assembled one byte position at a
+    time: a couple of numpy passes over the values, none per byte.
+    """
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if len(raw) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    values = (raw[starts] & 0x7F).astype(np.uint64)
+    for position in range(1, int((ends - starts).max()) + 1):
+        index = starts + position
+        more = index <= ends
+        values[more] |= (raw[index[more]] & 0x7F).astype(np.uint64) << np.uint64(7 * position)
+    return values
+
+
+def encode_intervals_varint(intervals, scale, compress=False):
+    """
+    Intervals as integer ticks (1/scale s), each stored as the zigzag
+    varint of its difference from the previous one, optionally deflated,
+    as base64 so the payload stays one text line.
+    """
+    ticks = np.rint(np.asarray(intervals, dtype=float) * scale).astype(np.int64)
+    deltas = np.diff(ticks, prepend=0)
+    data = encode_varints(((deltas << 1) ^ (deltas >> 63)).astype(np.uint64))
+    if compress:
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -15)  # raw deflate: no header or checksum
+        data = deflate.compress(data) + deflate.flush()
+    return base64.b64encode(data).decode('ascii')
+
+
+def decode_intervals_varint(encoded, scale, compress=False):
+    data = base64.b64decode(encoded)
+    if compress:
+        data = zlib.decompress(data, -15)
+    if len(data) <= VARINT_LOOP_BYTES:
+        # A typical session is about a hundred bytes, where a dozen numpy calls cost more than the loop
+        ticks = []
+        tick = value = shift = 0
+        for byte in data:
+            if byte < 0x80:
+                value |= byte << shift
+                tick += value >> 1 ^ -(value & 1)
+                ticks.append(tick)
+                value = shift = 0
+            else:
+                value |= (byte & 0x7F) << shift
+                shift += 7
+        return np.array(ticks, dtype=float) / scale
+    zigzag = decode_varints(data)
+    deltas = (zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64)
+    return np.cumsum(deltas) / scale
+
+
+def decode_intervals_varint_batch(encoded, scale, compress=False):
+    """
+    decode_intervals_varint() of a list of payloads as one array: the
+    payloads are joined, decoded in one pass and split again, the running
+    sum restarting at every payload, so numpy's per-call cost is paid once
+    per batch instead of once per session.
+    """
+    chunks = [base64.b64decode(payload) for payload in encoded]
+    if compress:
+        chunks = [zlib.decompress(chunk, -15) for chunk in chunks]
+    data = b"".join(chunks)
+    if not data:
+        return [np.zeros(0) for _ in chunks]
+    zigzag = decode_varints(data)
+    ticks = np.cumsum((zigzag >> np.uint64(1)).view(np.int64) ^ -(zigzag & np.uint64(1)).view(np.int64))
+    # values ending before each payload's first byte: every byte below 0x80 ends one
+    ended = np.cumsum(np.frombuffer(data, dtype=np.uint8) < 0x80)
+    byte_starts = np.cumsum([0] + [len(chunk) for chunk in chunks[:-1]])
+    starts = np.where(byte_starts > 0, ended[np.maximum(byte_starts - 1, 0)], 0)
+    bounds = np.append(starts, len(ticks))
+    base = np.where(starts > 0, ticks[np.maximum(starts - 1, 0)], 0)
+    seconds = (ticks - np.repeat(base, np.diff(bounds))) / scale
+    bounds = bounds.tolist()
+    return [seconds[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
+def interval_codec(scale, compress=False):
+    return (lambda intervals: encode_intervals_varint(intervals, scale, compress),
+            lambda encoded: decode_intervals_varint(encoded, scale, compress),
+            lambda encoded: decode_intervals_varint_batch(encoded, scale, compress))
+
+
+def decode_intervals_batch(pending):
+    """
+    Decodes a list of (encoding, payload) pairs, as decode_session(...,
+    decode_intervals=False) leaves them, with one batch decode per
+    encoding. Formats before schema 2 come back as arrays already and
+    None entries stay None; both pass through as they are.
+    """
+    decoded = list(pending)
+    by_encoding = {}
+    for index, item in enumerate(pending):
+        if isinstance(item, tuple):
+            by_encoding.setdefault(item[0], []).append(index)
+    for encoding, indexes in by_encoding.items():
+        arrays = INTERVAL_ENCODINGS[encoding][2]([pending[index][1] for index in indexes])
+        for index, intervals in zip(indexes, arrays):
+            decoded[index] = intervals
+    return decoded
+
+
+# name -> (encoder, decoder, batch decoder) for the Intervals payload line
+INTERVAL_ENCODINGS = {
+    "text-ms": (encode_intervals_text, decode_intervals_text,  # seconds to the millisecond, comma separated
+                lambda encoded: [decode_intervals_text(payload) for payload in encoded]),
+    "varint-ms": interval_codec(1000),
+    "varint-ms+zlib": interval_codec(1000, compress=True),
+    "varint-us": interval_codec(1000000),
+    "varint-us+zlib": interval_codec(1000000, compress=True),
+}
+
+
+def legacy_key_events(encoded):
+    # Key events of files from before the varint encoding, re-encoded so every reader sees one format
+    return EventLog.decode_text(encoded).encode() if encoded is not None else None
+
+
+def parse_key_counts(value):
+    # "45 correct, 1 wrong, 0 backspace, 0 other" -> {"correct": 45, ...}
+    return {name: int(count) for count, name in (item.split(" ") for item in value.split(", "))}
+
+
+# File line key -> (decoded name, parser). Unknown keys are kept as text under their own name,
+# so a reader never fails on fields added by a later schema.
+SESSION_FIELDS = {
+    "Schema": ("schema", int),
+    "WPM": ("wpm", float),
+    "Accuracy": ("accuracy", lambda value: float(value.rstrip("%"))),
+    "Timestamp": ("timestamp", str),
+    "Elapsed": ("elapsed", lambda value: float(value.split()[0])),
+    "Avg Time Between Letters": ("avg_time", lambda value: float(value.split()[0])),
+    "Passage": ("passage", str),
+    "Keys": ("keys", parse_key_counts),
+    "Typos": ("typos", int),
+    "Interval Encoding": ("interval_encoding", str),
+    "Prev": ("prev", str),
+    "Sentence": ("sentence", str),
+    "Intervals": ("intervals", str),
+    "Time Between Letters (s)": ("intervals", str),  # schema 1
+    "Typo Log (position:code point)": ("typo_log", str),
+    "Key Events": ("key_events", str),
+    "Key Events (kind code point + ns)": ("key_events_text", str),  # files from before the varint encoding
+    "HMAC": ("hmac", str),
+}
+
+
+def decode_session_fields(lines, stop_at_blank):
+    session = {}
+    for line in lines:
+        if not line and stop_at_blank:
+            break
+        key, sep, value = line.partition(": ")
+        if sep:
+            name, parse = SESSION_FIELDS.get(key, (key, str))
+            session[name] = parse(value)
+    return session
+
+
+def decode_session_header(lines):
+    """
+    The header fields of a schema 2 session file as a dict (wpm, accuracy,
+    timestamp, elapsed, avg_time, passage, keys, typos, ...). Stops at the
+    blank line, so the sentence and per-key payloads are never looked at.
+    """
+    return decode_session_fields(lines, stop_at_blank=True)
+
+
+def decode_session(lines, decode_intervals=True):
+    """
+    Every field of a session file, schema 1 or 2, with the intervals
+    decoded to a float array by the file's interval encoding and the
+    sentence looked up in the passage table when the file only names its
+    passage. Key events and the typo log stay encoded (see
+    EventLog.decode()). With decode_intervals=False the intervals are left
+    as an (encoding, payload) pair for decode_intervals_batch().
+    """
+    session = decode_session_fields(lines, stop_at_blank=False)
+    if "key_events_text" in session:
+        session["key_events"] = legacy_key_events(session.pop("key_events_text"))
+    if "sentence" not in session and "passage" in session:
+        session["sentence"] = resolve_passage(session["passage"])
+    if "intervals" in session:
+        encoding = session.get("interval_encoding", "text-ms")
+        if encoding not in INTERVAL_ENCODINGS:
+            raise KeyError(encoding)
+        if decode_intervals:
+            session["intervals"] = INTERVAL_ENCODINGS[encoding][1](session["intervals"])
+        else:
+            session["intervals"] = (encoding, session["intervals"])
+    return session
+
+
+def format_session(wpm, accuracy, timestamp, time_between_letters, sentence, error_log=None, event_log=None,
+                   prev_hash=None, elapsed=None, inline_sentence=True):
+    """
+    Encodes one session as signed schema SESSION_SCHEMA text, the same
+    whether it is saved locally or submitted to a server. The header holds
+    the results, the elapsed time, the passage ID, key and typo counts and
+    the interval encoding; the sentence and per-key payloads follow the
+    blank line. With inline_sentence=False the sentence is left out and
+    the passage ID refers to the passage table (see intern_passage()), as
+    in saved files; submission_content() puts it back for a server.
+    """
+    avg_time = sum(time_between_letters) / len(time_between_letters) if time_between_letters else 0.0
+    header = [
+        f"Schema: {SESSION_SCHEMA}",
+        f"WPM: {wpm:.2f}",
+        f"Accuracy: {accuracy:.2f}%",
+        f"Timestamp: {timestamp}",
+    ]
+    if elapsed is not None:
+        header.append(f"Elapsed: {elapsed:.3f} sec")
+    header.append(f"Avg Time Between Letters: {avg_time:.3f} sec")
+    header.append(f"Passage: {passage_id(sentence)}")
+    if event_log is not None:
+        header.append("Keys: " + ", ".join(f"{event_log.count(kind)} {name}"
+                                           for kind, name in enumerate(EventLog.KIND_NAMES)))
+    if error_log is not None:
+        header.append(f"Typos: {len(error_log)}")
+    header.append(f"Interval Encoding: {INTERVAL_ENCODING}")
+    if prev_hash is not None:
+        header.append(f"Prev: {prev_hash}")
+
+    payload = [f"Sentence: {sentence}"] if inline_sentence else []
+    if time_between_letters:
+        # verify_hmac() checks every line above the HMAC, so the timings are signed too
+        payload.append(f"Intervals: {INTERVAL_ENCODINGS[INTERVAL_ENCODING][0](time_between_letters)}")
+    if error_log is not None and len(error_log):
+        payload.append(f"Typo Log (position:code point): {error_log.encode()}")
+    if event_log is not None and len(event_log):
+        payload.append(f"Key Events: {event_log.encode()}")
+
+    lines_to_sign = header + [""] + payload
+    lines_to_sign.append(f"HMAC: {compute_hmac(lines_to_sign)}")
+    return "\n".join(lines_to_sign) + "\n"
+
+
+def save_score(wpm, accuracy, time_between_letters, sentence, is_cheating, error_log=None, event_log=None,
+               elapsed=None):
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(STATS_FOLDER, exist_ok=True)
+    score_filename = os.path.join(STATS_FOLDER, f"stats{timestamp}.txt")
+    progress = None
+    # Loaded before the new file exists, so a first-time rebuild cannot index it twice
+    frontier = load_merkle_frontier()
+    session_name = os.path.basename(score_filename)
+    # Chain link: the hash of the session file saved before this one
+    if frontier["last"] is None or session_name > frontier["last"]:
+        prev_hash = frontier["last_leaf"] or "none"
+    else:
+        merkle_index = load_merkle_index()  # the clock was set back: find the file before this one
+        position = bisect_left(merkle_index["names"], session_name)
+        prev_hash = merkle_index["levels"][0][position - 1] if position else "none"
+
+    if is_cheating:
+        cheat_string = f"{wpm:.2f}{accuracy:.2f}{timestamp}"
+        cheat_hash = hashlib.sha256(cheat_string.encode('utf-8')).hexdigest()
+        cheat_content = (
+            f"CHEAT DETECTED\n"
+            f"Hash: {cheat_hash}\n"
+            "This session's stats are invalid due to detected macro or automated input.\n"
+            f"Prev: {prev_hash}\n"
+            "HMAC: INVALID\n"
+        )
+        with open(score_filename, "w", encoding='utf-8') as f:
+            f.write(cheat_content)
+        print(f"Cheating detected! Invalid stats saved to {score_filename}")
+    else:
+        # Loaded before the new file exists, so a first-time rebuild cannot count this run twice
+        baseline = load_baseline()
+        passage = intern_passage(sentence)
+        with open(score_filename, "w", encoding='utf-8') as f:
+            f.write(format_session(wpm, accuracy, timestamp, time_between_letters, sentence, error_log, event_log,
+                                   prev_hash, elapsed, inline_sentence=False))
+        print(f"Score saved to {score_filename}")
+
+        # Fold the run into the aggregates cache before stats.txt picks it up
+        aggregates = load_aggregates()
+        progress = update_aggregates(aggregates, wpm, accuracy, passage)
+        save_aggregates(aggregates)
+
+        # Verified sessions teach the anti-cheat what this player's rhythm looks like
+        if time_between_letters:
+            positions = event_log.pair_positions() if event_log is not None else None
+            update_baseline(baseline, time_between_letters, sentence, positions)
+            save_baseline(baseline)
+
+    # Cheat files are indexed too: the index covers the archive as it is on disk
+    with open(score_filename, "rb") as f:
+        merkle_append(frontier, session_name, merkle_leaf(session_name, f.read()))
+    save_merkle_frontier(frontier)
+
+    # Now rebuild cumulative stats.txt from all valid files
+    rebuild_cumulative_stats()
+    return progress
+
+
+class Colors:
+    RED = "\033[31m"
+    GREEN = "\033[32m"
+    CYAN = "\033[36m"
+    RESET = "\033[0m"
+    UNDERLINE = "\033[4m"
+
+
+class LiveMetrics:
+    """
+    Running counters for the in-game status line. Every update is O(1):
+    the rolling WPM only keeps the times of the last ROLLING_KEYS correct
+    keys, and the text is rebuilt at most once per STATUS_REFRESH_INTERVAL.
+    """
+
+    def __init__(self, total_chars, start):
+        self.total_chars = total_chars
+        self.start = start
+        self.correct = 0
+        self.errors = 0
+        self.recent = deque([start], maxlen=ROLLING_KEYS + 1)
+        self.refreshed_at = None
+        self.status = ""
+        self.last_error = None
+
+    def correct_key(self, now):
+        self.correct += 1
+        self.recent.append(now)
+        if self.last_error is not None:
+            self.last_error = None
+            self.refreshed_at = None  # clear the typo marker on the next frame
+
+    def wrong_key(self, typed, expected):
+        self.errors += 1
+        self.last_error = (typed, expected)
+        self.refreshed_at = None  # typos show up on the very next frame
+
+    def backspace(self):
+        self.correct -= 1
+
+    def status_line(self, now):
+        if self.refreshed_at is not None and now - self.refreshed_at < STATUS_REFRESH_INTERVAL:
+            return self.status
+        self.refreshed_at = now
+
+        wpm = calculate_wpm(self.correct, now - self.start)
+        rolling_wpm = calculate_wpm(len(self.recent) - 1, self.recent[-1] - self.recent[0])
+        progress = self.correct / self.total_chars * 100 if self.total_chars else 100.0
+        self.status = (f"WPM: {wpm:5.1f} | Last {ROLLING_KEYS}: {rolling_wpm:5.1f} | "
+                       f"Errors: {self.errors} | {progress:3.0f}%")
+        if self.last_error is not None:
+            typed, expected = self.last_error
+            self.status += f" | {Colors.RED}Typo: {typed!r}, type {expected!r}{Colors.RESET}"
+        return self.status
+
+
+class EventLog:
+    """
+    Every key pressed during a test, kept in three parallel typed arrays:
+    code point, kind and nanoseconds since the previous event. That is 13
+    bytes per key, whatever was pressed. Named keys are stored as code point 0.
+    """
+
+    CORRECT, WRONG, BACKSPACE, NAMED_KEY = range(4)
+    KIND_CODES = "CWBN"
+    KIND_NAMES = ("correct", "wrong", "backspace", "other")
+
+    def __init__(self, start):
+        self.keys = array('I')
+        self.kinds = array('B')
+        self.deltas_ns = array('Q')
+        self.last_time = start
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def record(self, key, kind, now):
+        self.keys.append(ord(key) if len(key) == 1 else 0)
+        self.kinds.append(kind)
+        self.deltas_ns.append(max(0, round((now - self.last_time) * 1e9)))
+        self.last_time = now
+
+    def count(self, kind):
+        return self.kinds.count(kind)
+
+    def pair_positions(self):
+        """
+        Passage position of every correct key, in the order of the
+        intervals run_typing_loop() returns, or -1 for a key typed right
+        after a typo, backspace or named key: its interval spans the
+        correction and is no letter-pair timing. Backspaces move the
+        position back (never below 0), so retyped letters keep their place.
+        """
+        kinds = np.frombuffer(self.kinds, dtype=np.uint8)
+        steps = (kinds == self.CORRECT).astype(np.int64) - (kinds == self.BACKSPACE)
+        walk = np.cumsum(steps)
+        # A backspace at the start deletes nothing: the walk reflected at 0
+        after = walk - np.minimum(np.minimum.accumulate(walk), 0)
+        correct = kinds == self.CORRECT
+        clean = np.concatenate(([False], kinds[:-1] == self.CORRECT))
+        return np.where(clean[correct], after[correct] - 1, -1)
+
+    def encode(self):
+        """
+        Base64 of two varints per event (see encode_varints()): code point
+        * 4 + kind, then the nanoseconds since the previous event. About 6
+        bytes per key, 8 as text.
+        """
+        values = np.empty(2 * len(self.kinds), dtype=np.uint64)
+        values[0::2] = np.frombuffer(self.keys, dtype=np.uint32).astype(np.uint64) << np.uint64(2)
+        values[0::2] |= np.frombuffer(self.kinds, dtype=np.uint8).astype(np.uint64)
+        values[1::2] = np.frombuffer(self.deltas_ns, dtype=np.uint64)
+        return base64.b64encode(encode_varints(values)).decode('ascii')
+
+    @classmethod
+    def decode(cls, encoded):
+        values = decode_varints(base64.b64decode(encoded))
+        event_log = cls(0.0)
+        event_log.keys = array('I', (values[0::2] >> np.uint64(2)).astype(np.uint32).tobytes())
+        event_log.kinds = array('B', (values[0::2] & np.uint64(3)).astype(np.uint8).tobytes())
+        event_log.deltas_ns = array('Q', values[1::2].tobytes())
+        return event_log
+
+    @classmethod
+    def decode_text(cls, encoded):
+        # The first encoding: <kind><code point>+<ns delta>, e.g. "C84+303124000 W120+51002311"
+        event_log = cls(0.0)
+        for event in encoded.split():
+            key, delta = event[1:].split("+")
+            event_log.keys.append(int(key))
+            event_log.kinds.append(cls.KIND_CODES.index(event[0]))
+            event_log.deltas_ns.append(int(delta))
+        return event_log
+
+
+class ErrorLog:
+    """
+    Compact record of every wrong key: the passage position and the code
+    point that was typed instead. The expected letter is the passage itself.
+    """
+
+    def __init__(self):
+        self.positions = array('I')
+        self.typed = array('I')
+
+    def __len__(self):
+        return len(self.positions)
+
+    def record(self, position, typed):
+        self.positions.append(position)
+        self.typed.append(ord(typed))
+
+    def most_missed(self, text, count=3):
+        return Counter(text[position] for position in self.positions).most_common(count)
+
+    def encode(self):
+        return ", ".join(f"{p}:{c}" for p, c in zip(self.positions, self.typed))
+
+
+class RenderScheduler:
+    """
+    Coalesces redraw requests into at most RENDER_HZ frames per second.
+    The typing loop marks the screen dirty per key and only draws once no
+    more input is waiting and the next frame is due, so drawing never sits
+    between a key arriving and its timestamp being taken.
+    """
+
+    def __init__(self, refresh_hz=RENDER_HZ):
+        self.frame_interval = 1 / refresh_hz
+        self.pending = False
+        self.next_frame = 0.0
+
+    def request(self):
+        self.pending = True
+
+    def time_until_frame(self, now):
+        # None means nothing to draw, so the loop may block until the next key
+        if not self.pending:
+            return None
+        return max(0.0, self.next_frame - now)
+
+    def frame_drawn(self, now):
+        self.pending = False
+        self.next_frame = now + self.frame_interval
+
+
+def wrap_offsets(text, width):
+    """
+    Word-wraps text to width columns and returns the start offset of every
+    line. Spaces stay at the end of the line they follow, so offsets map
+    one to one onto the characters the player types.
+    """
+    starts = [0]
+    pos = 0
+    while len(text) - pos > width:
+        space = text.rfind(" ", pos, pos + width)
+        pos = space + 1 if space >= pos else pos + width
+        starts.append(pos)
+    return starts
+
+
+class PassageViewport:
+    """
+    Scrolling window over a wrapped passage. Only the visible rows around
+    current_index are drawn, so a frame costs the same for a sentence and
+    for a 100 KB passage. The status line sits on the row below the window.
+
+    The passage is encoded to UTF-8 once when the test starts. A frame is
+    then assembled from slices of those bytes plus the highlight escapes
+    in a reused bytearray and sent with a single os.write.
+    """
+
+    HIGHLIGHT = (Colors.CYAN + Colors.UNDERLINE).encode()
+    RESET = Colors.RESET.encode()
+    CLEAR_LINE = b"\033[K\n"
+
+    def __init__(self, text, max_rows=VIEWPORT_MAX_ROWS, out_fd=None):
+        columns, lines = shutil.get_terminal_size()
+        self.text = text
+        self.width = max(columns - 1, 10)
+        self.line_starts = wrap_offsets(text, self.width)
+        self.rows = max(1, min(max_rows, lines - 2, len(self.line_starts)))
+        self.drawn_rows = 0
+
+        data = text.encode('utf-8')
+        if len(data) == len(text):
+            self.byte_offsets = None  # pure ASCII: character index == byte offset
+        else:
+            self.byte_offsets = array('I', [0])
+            for c in text:
+                self.byte_offsets.append(self.byte_offsets[-1] + len(c.encode('utf-8')))
+        # Every wrapped line becomes a ready to send segment; only the line
+        # holding the cursor is ever rebuilt
+        bounds = [self.offset(start) for start in self.line_starts] + [len(data)]
+        self.line_data = [data[bounds[i]:bounds[i + 1]] for i in range(len(self.line_starts))]
+        self.segments = [b"\r" + line + self.CLEAR_LINE for line in self.line_data]
+        self.cursor_up = f"\033[{self.rows}A".encode()
+        self.frame = bytearray()
+        self.status = None
+        self.status_bytes = b""
+
+        self.out_fd = out_fd
+        if out_fd is None and os.name != 'nt':
+            sys.stdout.flush()
+            self.out_fd = sys.stdout.fileno()
+
+    def line_end(self, line):
+        return self.line_starts[line + 1] if line + 1 < len(self.line_starts) else len(self.text)
+
+    def offset(self, index):
+        return index if self.byte_offsets is None else self.byte_offsets[index]
+
+    def render(self, current_index, status=""):
+        line = bisect_right(self.line_starts, current_index) - 1
+        # Keep the current line on the second row so the next line is always visible
+        first = max(0, min(line - 1, len(self.line_starts) - self.rows))
+        last = first + self.rows
+        frame = self.frame
+        del frame[:]
+        if self.drawn_rows:
+            frame += self.cursor_up  # back to the top row of the window
+
+        if current_index < len(self.text):
+            line_start = self.offset(self.line_starts[line])
+            cell_start = self.offset(current_index) - line_start
+            cell_end = self.offset(current_index + 1) - line_start
+            data = self.line_data[line]
+            frame += b"".join(self.segments[first:line])
+            frame += b"".join((b"\r", data[:cell_start], self.HIGHLIGHT, data[cell_start:cell_end],
+                               self.RESET, data[cell_end:], self.CLEAR_LINE))
+            frame += b"".join(self.segments[line + 1:last])
+        else:
+            frame += b"".join(self.segments[first:last])
+
+        if status is not self.status:
+            self.status = status
+            self.status_bytes = b"\r" + status.encode('utf-8') + b"\033[K"
+        # Clear to the end of the line so a shorter status never leaves stale characters
+        frame += self.status_bytes
+        self.write(frame)
+        self.drawn_rows = self.rows
+
+    def write(self, frame):
+        if self.out_fd is None:
+            # Windows consoles may not use UTF-8, let sys.stdout do the encoding
+            sys.stdout.write(frame.decode('utf-8'))
+            sys.stdout.flush()
+            return
+        sys.stdout.flush()  # keep ordering with anything print()ed before this frame
+        written = os.write(self.out_fd, frame)
+        while written < len(frame):
+            written += os.write(self.out_fd, bytes(frame[written:]))
+
+
+def legacy_print_with_highlight(original_text, current_index, out):
+    """
+    The ver11 renderer, kept only as the baseline for the render benchmark.
+    """
+    print("\r", end="", file=out)
+    for i, c in enumerate(original_text):
+        if i == current_index:
+            print(f"{Colors.CYAN}{Colors.UNDERLINE}{c}{Colors.RESET}", end="", file=out)
+        else:
+            print(c, end="", file=out)
+    print("  ", end="", flush=True, file=out)
+
+
+def bench_render(args):
+    """
+    Replays typing every character of a passage through the old per-character
+    renderer and through PassageViewport, and reports CPU time per keystroke.
+    """
+    base = "The quick brown fox jumps over the lazy dog. "
+    text = (base * (args.chars // len(base) + 1))[:args.chars]
+    metrics = LiveMetrics(len(text), 0.0)
+    status = metrics.status_line(0.0)
+
+    with open(os.devnull, "w", encoding='utf-8') as devnull:
+        started = time.process_time()
+        for i in range(len(text)):
+            legacy_print_with_highlight(text, i, devnull)
+        legacy = (time.process_time() - started) / len(text)
+
+        viewport = PassageViewport(text, out_fd=devnull.fileno())
+        started = time.process_time()
+        for i in range(len(text)):
+            viewport.render(i, status)
+        current = (time.process_time() - started) / len(text)
+
+    print(f"Replayed {len(text)} keystrokes")
+    print(f"ver11 print_with_highlight: {legacy * 1e6:9.1f} us CPU per key")
+    print(f"PassageViewport:            {current * 1e6:9.1f} us CPU per key")
+    if current > 0:
+        print(f"Speedup: {legacy / current:.1f}x")
+
+
+def load_stats_series():
+    """
+    Parses stats.txt into one list per metric in PLOT_METRICS.
+    Returns None when there is no stats file yet.
+    """
+    stats_filename = os.path.join(STATS_FOLDER, "stats.txt")
+    if not os.path.isfile(stats_filename):
+        return None
+
+    series = {metric: [] for metric in PLOT_METRICS}
+
+    for record in iter_stats_records([stats_filename]):
+        if record.cheat:
+            continue
+        series["wpm"].append(record.wpm)
+        series["time"].append(record.elapsed or 0.0)
+        series["accuracy"].append(record.accuracy)
+        series["avg_time"].append(record.avg_time)
+    return series
+
+
+def bucket_min_max_sum(values, bucket_size):
+    """
+    Splits values into consecutive buckets of bucket_size runs and returns
+    (mins, maxs, sums) arrays. The last bucket may be partial.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        empty = np.empty(0)
+        return empty, empty, empty
+    starts = np.arange(0, len(values), bucket_size)
+    mins = np.minimum.reduceat(values, starts)
+    maxs = np.maximum.reduceat(values, starts)
+    sums = np.add.reduceat(values, starts)
+    return mins, maxs, sums
+
+
+def bucket_means(sums, counts):
+    # stats.txt values have at most 3 decimals, so rounding the sums first makes the means
+    # independent of the order they were added in (a rebuild and fold_rollups() agree)
+    return np.round(np.round(sums, 3) / counts, 3)
+
+
+def lttb(xs, ys, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Returns the indices of the
+    points to keep, always including the first and last one.
+    """
+    n = len(xs)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(int)
+    kept = np.empty(threshold, dtype=int)
+    kept[0] = 0
+    kept[-1] = n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        # Average of the next bucket is the third corner of the triangle
+        next_stop = edges[i + 2] if i + 2 < len(edges) else n
+        next_x = xs[stop:next_stop].mean() if next_stop > stop else xs[-1]
+        next_y = ys[stop:next_stop].mean() if next_stop > stop else ys[-1]
+        px, py = xs[previous], ys[previous]
+        areas = np.abs((px - next_x) * (ys[start:stop] - py) - (px - xs[start:stop]) * (next_y - py))
+        previous = start + int(np.argmax(areas))
+        kept[i + 1] = previous
+    return kept
+
+
+def build_rollups(series):
+    """
+    Precomputes min/max/mean buckets for every tier in ROLLUP_TIERS, with
+    the exact sum of each tier's last bucket so fold_rollups() can finish
+    it when more runs come in.
+    """
+    runs = len(series["wpm"])
+    rollups = {"runs": runs, "tiers": {}}
+    for tier in ROLLUP_TIERS:
+        tier_data = {}
+        counts = np.diff(np.append(np.arange(0, runs, tier), runs))
+        for metric in PLOT_METRICS:
+            mins, maxs, sums = bucket_min_max_sum(series[metric], tier)
+            tier_data[metric] = {
+                "min": np.round(mins, 3).tolist(),
+                "max": np.round(maxs, 3).tolist(),
+                "mean": bucket_means(sums, counts).tolist(),
+                "last_sum": float(sums[-1]) if runs else 0.0,
+            }
+        rollups["tiers"][str(tier)] = tier_data
+    return rollups
+
+
+def fold_rollups(rollups, series):
+    """
+    Adds the runs of series (one list per metric, as load_stats_series()
+    gives them) to rollups in place: the partial last bucket of each tier
+    is filled up first, its mean taken from the stored sum, and the rest
+    become new buckets. Saving a session so never re-reads stats.txt.
+    """
+    for tier in ROLLUP_TIERS:
+        filled = rollups["runs"] % tier
+        for metric in PLOT_METRICS:
+            data = rollups["tiers"][str(tier)][metric]
+            values = np.asarray(series[metric], dtype=float)
+            if filled and len(values):
+                head = values[:tier - filled]
+                data["min"][-1] = min(data["min"][-1], float(np.round(head.min(), 3)))
+                data["max"][-1] = max(data["max"][-1], float(np.round(head.max(), 3)))
+                data["last_sum"] += float(head.sum())
+                data["mean"][-1] = float(bucket_means(data["last_sum"], filled + len(head)))
+                values = values[len(head):]
+            if len(values):
+                mins, maxs, sums = bucket_min_max_sum(values, tier)
+                counts = np.diff(np.append(np.arange(0, len(values), tier), len(values)))
+                data["min"].extend(np.round(mins, 3).tolist())
+                data["max"].extend(np.round(maxs, 3).tolist())
+                data["mean"].extend(bucket_means(sums, counts).tolist())
+                data["last_sum"] = float(sums[-1])
+    rollups["runs"] += len(series["wpm"])
+    return rollups
+
+
+def save_rollups(rollups):
+    tmp_filename = ROLLUPS_FILE + ".tmp"
+    with open(tmp_filename, "w", encoding='utf-8') as f:
+        f.write(json.dumps(rollups))  # dumps() encodes in C, dump() streams chunk by chunk in Python
+    os.replace(tmp_filename, ROLLUPS_FILE)
+
+
+def load_rollups():
+    try:
+        with open(ROLLUPS_FILE, "r", encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pick_rollup_tier(rollups, first_run, last_run):
+    """
+    Returns the finest tier that keeps the visible range under MAX_PLOT_POINTS,
+    or None when raw runs (downsampled with LTTB) are the better choice.
+    """
+    span = last_run - first_run + 1
+    if span <= MAX_PLOT_POINTS * ROLLUP_TIERS[0] // 2:
+        return None
+    for tier in ROLLUP_TIERS:
+        if str(tier) in rollups["tiers"] and span / tier <= MAX_PLOT_POINTS:
+            return tier
+    return max((int(t) for t in rollups["tiers"]), default=None)
+
+
+class DetailPlot:
+    """
+    Draws one metric at a level of detail that matches the visible x range.
+    The overview comes from the precomputed rollups; raw runs are only
+    loaded from stats.txt once the user zooms in far enough to need them.
+    """
+
+    def __init__(self, ax, metric, color, rollups, raw_loader):
+        self.ax = ax
+        self.metric = metric
+        self.rollups = rollups
+        self.raw_loader = raw_loader
+        self.line, = ax.plot([], [], color=color, linewidth=1)
+        self.band = None
+        self.color = color
+
+    def draw(self, first_run, last_run):
+        first_run = max(first_run, 1)
+        last_run = min(last_run, self.rollups["runs"])
+        if self.band is not None:
+            self.band.remove()
+            self.band = None
+        if last_run < first_run:
+            return
+
+        tier = pick_rollup_tier(self.rollups, first_run, last_run)
+        if tier is not None:
+            data = self.rollups["tiers"][str(tier)][self.metric]
+            lo = (first_run - 1) // tier
+            hi = (last_run - 1) // tier + 1
+            x_vals = np.arange(lo, hi) * tier + (tier + 1) / 2
+            self.line.set_data(x_vals, data["mean"][lo:hi])
+            self.line.set_marker("")
+            self.band = self.ax.fill_between(x_vals, data["min"][lo:hi], data["max"][lo:hi],
+                                             color=self.color, alpha=0.2, linewidth=0)
+        else:
+            values = self.raw_loader()[self.metric][first_run - 1:last_run]
+            x_vals = np.arange(first_run, first_run + len(values))
+            keep = lttb(x_vals, values, MAX_PLOT_POINTS)
+            self.line.set_data(x_vals[keep], np.asarray(values, dtype=float)[keep])
+            self.line.set_marker("o" if len(keep) <= MARKER_PLOT_POINTS else "")
+
+
+def plot_stats():
+    stats_filename = os.path.join(STATS_FOLDER, "stats.txt")
+    if not os.path.isfile(stats_filename):
+        print("No stats file found. Please complete at least one typing test first.")
+        return
+
+    raw_cache = {}
+
+    def raw_loader():
+        if "series" not in raw_cache:
+            # A running stats daemon has the series in memory already
+            series = query_daemon("series")
+            raw_cache["series"] = decode_series(series) if series is not None else load_stats_series()
+        return raw_cache["series"]
+
+    rollups = query_daemon("rollups") or load_rollups()
+    if rollups is None:
+        rollups = build_rollups(raw_loader())
+
+    runs = rollups["runs"]
+    if not runs:
+        print("No valid stats data found to plot.")
+        return
+
+    fig, axs = plt.subplots(2, 2, figsize=(12, 8), sharex=True)
+    panels = (
+        (axs[0, 0], "wpm", "blue", "WPM over Runs", "WPM"),
+        (axs[0, 1], "accuracy", "green", "Accuracy (%) over Runs", "Accuracy (%)"),
+        (axs[1, 0], "time", "red", "Time Taken (seconds) over Runs", "Time (s)"),
+        (axs[1, 1], "avg_time", "purple", "Avg Time Between Letters (seconds) over Runs", "Avg Time Between Letters (s)"),
+    )
+    detail_plots = []
+    for ax, metric, color, title, ylabel in panels:
+        detail = DetailPlot(ax, metric, color, rollups, raw_loader)
+        detail.draw(1, runs)
+        detail_plots.append(detail)
+        ax.set_title(title)
+        ax.set_xlabel("Run Number")
+        ax.set_ylabel(ylabel)
+        ax.relim()
+        ax.autoscale_view(scalex=False)
+        # Fixed limits from the overview, so redrawing detail never triggers autoscaling
+        ax.set_autoscaley_on(False)
+    axs[0, 0].set_xlim(0.5, runs + 0.5)
+
+    def on_xlim_changed(ax):
+        # Subplots share the x axis, but only the zoomed one reports the change
+        lo, hi = ax.get_xlim()
+        for detail in detail_plots:
+            detail.draw(int(np.floor(lo)), int(np.ceil(hi)))
+        fig.canvas.draw_idle()
+
+    for ax in axs.flat:
+        ax.callbacks.connect("xlim_changed", on_xlim_changed)
+
+    plt.tight_layout()
+
+    def on_key(event):
+        if event.key.lower() == "c":
+            plt.close(event.canvas.figure)
+
+    fig.canvas.mpl_connect("key_press_event", on_key)
+    plt.show()
+
+
+def print_progress(progress):
+    print("\n--- Progress ---")
+    if progress["new_pb"]:
+        print(f"{Colors.GREEN}New personal best WPM!{Colors.RESET}")
+    elif progress["new_sentence_pb"]:
+        print(f"{Colors.GREEN}New personal best for this sentence!{Colors.RESET}")
+    if progress["new_accuracy_pb"]:
+        print(f"{Colors.GREEN}New personal best accuracy!{Colors.RESET}")
+    print(f"WPM trend: {progress['wpm_trend']} (moving average {progress['ema_wpm']:.2f})")
+    print(f"Accuracy trend: {progress['accuracy_trend']} (moving average {progress['ema_accuracy']:.2f}%)")
+    print(f"Your WPM percentiles: median {progress['p50_wpm']:.0f}, top 10% above {progress['p90_wpm']:.0f}")
+
+
+def run_typing_loop(text, keyboard, viewport):
+    """
+    Runs one test over text with keys from keyboard, which is a
+    KeyboardSession or any object with the same clock()/key_ready()/
+    read_keys() methods (see SimulatedKeyboard). All timing comes from
+    keyboard.clock(). Returns (elapsed, time_stamps, event_log, error_log).
+    """
+    typed = []
+    current_index = 0
+    time_stamps = []
+    start = keyboard.clock()
+    last_time = start
+    metrics = LiveMetrics(len(text), start)
+    scheduler = RenderScheduler()
+    error_log = ErrorLog()
+    event_log = EventLog(start)
+
+    viewport.render(current_index, metrics.status_line(start))
+
+    while current_index < len(text):
+        if not keyboard.key_ready(scheduler.time_until_frame(keyboard.clock())):
+            # No key waiting and a frame is due: draw everything typed so far at once
+            frame_time = keyboard.clock()
+            viewport.render(current_index, metrics.status_line(frame_time))
+            scheduler.frame_drawn(frame_time)
+            continue
+
+        # One wakeup per batch: a paste or a fast burst arrives as one read
+        now, keys = keyboard.read_keys()
+
+        for ch in keys:
+            if current_index >= len(text):
+                break
+
+            # Handle backspace
+            if ch in ("\b", "\x7f"):
+                event_log.record(ch, EventLog.BACKSPACE, now)
+                if typed:
+                    typed.pop()
+                    current_index -= 1
+                    metrics.backspace()
+                    scheduler.request()
+                continue
+
+            if len(ch) != 1:
+                event_log.record(ch, EventLog.NAMED_KEY, now)
+                continue  # navigation and function keys mean nothing in a typing test
+
+            expected_char = text[current_index]
+            if ch != expected_char:
+                # Shown in place on the status row; no line per typo
+                event_log.record(ch, EventLog.WRONG, now)
+                metrics.wrong_key(ch, expected_char)
+                error_log.record(current_index, ch)
+                scheduler.request()
+                continue
+
+            event_log.record(ch, EventLog.CORRECT, now)
+            typed.append(ch)
+            time_stamps.append(now - last_time)
+            last_time = now
+            metrics.correct_key(now)
+
+            current_index += 1
+            scheduler.request()
+
+    end = keyboard.clock()
+    viewport.render(current_index, metrics.status_line(end))
+    return end - start, time_stamps, event_log, error_log
+
+
+def typing_test(input_source=None):
+    print("Welcome to Offline KeyDash with Letter Highlighting and Stats!\n")
+    text = get_text()
+    print("\nType the following text as fast and accurately as you can:\n")
+    if len(text) <= PREVIEW_CHARS:
+        print(text)
+    else:
+        print(f"{text[:PREVIEW_CHARS]}... ({len(text)} characters)")
+    with (input_source or KeyboardSession()) as keyboard:
+        # The prompt reads through the same session as the test, so no key is left behind in a buffer
+        print("\nPress Enter when ready to start...")
+        keyboard.wait_for_enter()
+        print("\nStart typing:\n")
+        elapsed, time_stamps, event_log, error_log = run_typing_loop(text, keyboard, PassageViewport(text))
+    wpm = calculate_wpm(len(text), elapsed)
+    accuracy = calculate_keystroke_accuracy(event_log.count(EventLog.CORRECT), event_log.count(EventLog.WRONG))
+    avg_time_between_letters = sum(time_stamps) / len(time_stamps) if time_stamps else 0
+
+    risk, features = anticheat_risk(time_stamps, text, load_baseline(), event_log.count(EventLog.WRONG),
+                                    event_log.pair_positions())
+    is_cheating = risk >= ANTICHEAT_RISK_THRESHOLD
+    if is_cheating:
+        reasons = ", ".join(name.replace("_", " ") for name, level in zip(ANTICHEAT_FEATURES, features) if level >= 0.5)
+        print(
+            f"\n{Colors.RED}[Anti-Cheat] Warning: Detected machine-like keypresses (risk {risk:.2f}: {reasons})."
+        )
+        print(f"This may indicate use of automated input or macros.{Colors.RESET}\n")
+
+    print("\n\n--- Results ---")
+    print(f"Time taken: {elapsed:.2f} seconds")
+    print(f"WPM: {wpm:.2f}")
+    print(f"Accuracy: {accuracy:.2f}%")
+    print(f"Typos: {len(error_log)}")
+    if len(error_log):
+        missed = ", ".join(f"{c!r} x{n}" for c, n in error_log.most_missed(text))
+        print(f"Most missed letters: {missed}")
+    print(f"Average time between letters: {avg_time_between_letters:.3f} seconds")
+    print("Time between letters (seconds):")
+    print(", ".join(f"{t:.3f}" for t in time_stamps))
+
+    progress = save_score(wpm, accuracy, time_stamps, sentence=text, is_cheating=is_cheating,
+                          error_log=error_log, event_log=event_log, elapsed=elapsed)
+    if progress is not None:
+        print_progress(progress)
+
+
+class SimulatedKeyboard:
+    """
+    Input source that feeds a prepared stream of (time, key) events into
+    run_typing_loop() instead of the terminal. Time is virtual: the clock
+    jumps to each event, so a simulated minute of typing runs in
+    milliseconds. Events sharing a timestamp arrive as one batch, like a
+    paste.
+    """
+
+    def __init__(self, events):
+        self.events = events
+        self.position = 0
+        self.now = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def wait_for_enter(self):
+        pass  # the events start after Enter
+
+    def clock(self):
+        return self.now
+
+    def key_ready(self, timeout):
+        if self.position >= len(self.events):
+            raise EOFError("simulated input ran out before the passage was finished")
+        if timeout is None or self.events[self.position][0] <= self.now + timeout:
+            return True
+        self.now += timeout
+        return False
+
+    def read_keys(self):
+        now = max(self.now, self.events[self.position][0])
+        keys = []
+        while self.position < len(self.events) and self.events[self.position][0] <= now:
+            keys.append(self.events[self.position][1])
+            self.position += 1
+        self.now = now
+        return now, keys
+
+
+def simulate_human(text, rng):
+    """
+    Human-like reference typist: every letter pair has its own base speed,
+    noise is log-normal, the pace drifts slowly and about 3% of keys start
+    with a typo that is noticed and fixed. Half the time the fix starts
+    with a reflexive backspace, which deletes the previous (correct)
+    letter, so it is typed again.
+    """
+    t = rng.uniform(0.3, 0.8)  # reaction time after Enter
+    speed = rng.uniform(0.7, 1.4)
+    drift = 0.0
+    events = []
+    for i, ch in enumerate(text):
+        bigram = text[max(i - 1, 0):i + 1]
+        base = 0.08 + 0.22 * (zlib.crc32(bigram.encode('utf-8')) / 0xFFFFFFFF)
+        drift = 0.9 * drift + rng.gauss(0, 0.01)
+        if i:
+            t += max(0.025, base * speed * rng.lognormvariate(0, 0.25) + drift)
+        if rng.random() < 0.03:
+            events.append((t, chr(ord(ch) ^ 1) if ch.isalpha() else "x"))
+            t += rng.uniform(0.2, 0.4)
+            if i and rng.random() < 0.5:
+                events.append((t, "\x7f"))
+                t += rng.uniform(0.1, 0.2)
+                events.append((t, text[i - 1]))
+                t += rng.uniform(0.1, 0.2)
+        events.append((t, ch))
+    return events
+
+
+def simulate_constant_bot(text, rng):
+    interval = rng.uniform(0.04, 0.15)
+    return [(0.5 + i * interval, ch) for i, ch in enumerate(text)]
+
+
+def simulate_jitter_bot(text, rng):
+    mean = rng.uniform(0.06, 0.2)
+    spread = mean * rng.uniform(0.05, 0.35)
+    t = 0.5
+    events = []
+    for ch in text:
+        events.append((t, ch))
+        t += max(0.01, rng.gauss(mean, spread))
+    return events
+
+
+def simulate_replay_bot(text, rng):
+    # Replays the clean rhythm of a recorded human run: same timings, typos dropped
+    trace = [t for t, ch in simulate_human(text, rng)]
+    start = trace[0]
+    intervals = [b - a for a, b in zip(trace, trace[1:])][:len(text) - 1]
+    events = [(start, text[0])]
+    for ch, interval in zip(text[1:], intervals):
+        events.append((events[-1][0] + interval, ch))
+    return events
+
+
+def simulate_burst_macro(text, rng):
+    t = 0.5
+    events = []
+    i = 0
+    while i < len(text):
+        burst = rng.randint(3, 8)
+        for ch in text[i:i + burst]:
+            events.append((t, ch))
+            t += rng.uniform(0.005, 0.015)
+        i += burst
+        t += rng.uniform(0.2, 0.6)
+    return events
+
+
+# name -> (event generator, label: 1 = machine)
+INPUT_SIMULATORS = {
+    "human": (simulate_human, 0),
+    "constant": (simulate_constant_bot, 1),
+    "jitter": (simulate_jitter_bot, 1),
+    "replay": (simulate_replay_bot, 1),
+    "burst": (simulate_burst_macro, 1),
+}
+
+
+def detect_ver11(time_stamps, text=None, wrong_keys=None, positions=None):
+    return legacy_machine_input_rule(time_stamps)
+
+
+ANTICHEAT_DETECTORS = {
+    "ver11 rule": detect_ver11,
+    "risk score": detect_machine_input,
+}
+
+
+def play_simulated_session(kind, seed, text):
+    """
+    run_typing_loop() over text with keys from one of INPUT_SIMULATORS,
+    drawing to /dev/null. Returns what run_typing_loop() returns.
+    """
+    generator, _ = INPUT_SIMULATORS[kind]
+    events = generator(text, random.Random(seed))
+    with open(os.devnull, "wb") as devnull:
+        with SimulatedKeyboard(events) as keyboard:
+            return run_typing_loop(text, keyboard, PassageViewport(text, out_fd=devnull.fileno()))
+
+
+def simulate_session(job):
+    """
+    Plays one simulated session through run_typing_loop() and runs every
+    detector in ANTICHEAT_DETECTORS on it. Runs inside benchmark workers.
+    """
+    kind, seed, text = job
+    _, label = INPUT_SIMULATORS[kind]
+    _, time_stamps, event_log, _ = play_simulated_session(kind, seed, text)
+
+    wrong_keys = event_log.count(EventLog.WRONG)
+    positions = event_log.pair_positions()
+    result = {"kind": kind, "label": label, "text": text, "intervals": time_stamps, "positions": positions.tolist(),
+              "wrong_keys": wrong_keys, "verdicts": {}, "costs": {}}
+    for name, detector in ANTICHEAT_DETECTORS.items():
+        started = time.perf_counter()
+        result["verdicts"][name] = bool(detector(time_stamps, text=text, wrong_keys=wrong_keys, positions=positions))
+        result["costs"][name] = time.perf_counter() - started
+    return result
+
+
+def bench_anticheat(args):
+    """
+    Simulates args.sessions sessions spread over INPUT_SIMULATORS and the
+    built-in sentences (plus one long passage) in a process pool, and
+    reports precision/recall and detection cost for every detector.
+    """
+    texts = SENTENCES + [" ".join(SENTENCES)]
+    kinds = sorted(INPUT_SIMULATORS)
+    jobs = [(kinds[i % len(kinds)], i, texts[(i // len(kinds)) % len(texts)]) for i in range(args.sessions)]
+
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.workers) as pool:
+        results = list(pool.imap_unordered(simulate_session, jobs, chunksize=32))
+    wall_time = time.perf_counter() - started
+
+    if args.corpus:
+        with open(args.corpus, "w", encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps({key: result[key] for key in ("kind", "label", "text", "intervals", "positions",
+                                                                 "wrong_keys")}) + "\n")
+        print(f"Corpus written to {args.corpus}")
+
+    print(f"Simulated {len(results)} sessions in {wall_time:.2f}s on {args.workers or os.cpu_count()} workers")
+    for name in ANTICHEAT_DETECTORS:
+        flagged = [r for r in results if r["verdicts"][name]]
+        machines = [r for r in results if r["label"]]
+        true_positives = sum(1 for r in flagged if r["label"])
+        precision = true_positives / len(flagged) if flagged else 1.0
+        recall = true_positives / len(machines) if machines else 1.0
+        cost = sum(r["costs"][name] for r in results) / len(results)
+        print(f"\n{name}: precision {precision:.3f}, recall {recall:.3f}, {cost * 1e6:.1f} us per session")
+        for kind in kinds:
+            of_kind = [r for r in results if r["kind"] == kind]
+            rate = sum(1 for r in of_kind if r["verdicts"][name]) / len(of_kind) if of_kind else 0.0
+            print(f"  {kind:<9} flagged {rate * 100:5.1f}%")
+
+
+def verify_submission(content):
+    """
+    Server-side check of one submitted session file (format_session()
+    text): the signature, the claimed results against what the signed key
+    events add up to, and the anti-cheat risk of the re-derived intervals.
+    Returns a dict with "valid", "reason", "wpm", "accuracy" and "risk".
+    """
+    result = {"valid": False, "reason": None, "wpm": None, "accuracy": None, "risk": None}
+    lines = content.splitlines()
+    if not verify_session_lines(lines):
+        result["reason"] = "bad signature"
+        return result
+
+    try:
+        session = decode_session(lines)
+        sentence = session["sentence"]
+        claimed_wpm = session["wpm"]
+        claimed_accuracy = session["accuracy"]
+        claimed_intervals = session["intervals"]
+        event_log = EventLog.decode(session["key_events"])
+    except (KeyError, ValueError):
+        result["reason"] = "missing or malformed fields"
+        return result
+
+    # The clock of every correct key, rebuilt from the nanosecond deltas
+    kinds = np.frombuffer(event_log.kinds, dtype=np.uint8)
+    times = np.cumsum(np.frombuffer(event_log.deltas_ns, dtype=np.uint64)) / 1e9
+    correct_times = times[kinds == EventLog.CORRECT]
+    intervals = np.diff(correct_times, prepend=0.0)
+    wrong_keys = int((kinds == EventLog.WRONG).sum())
+
+    if sentence is None or session.get("passage", passage_id(sentence)) != passage_id(sentence):
+        result["reason"] = "unknown passage"
+        return result
+    if len(correct_times) < len(sentence):
+        result["reason"] = "passage not finished"
+        return result
+    if len(claimed_intervals) != len(intervals) or np.abs(claimed_intervals - intervals).max() > VERIFY_INTERVAL_TOLERANCE:
+        result["reason"] = "intervals do not match key events"
+        return result
+
+    wpm = calculate_wpm(len(sentence), correct_times[-1])
+    accuracy = calculate_keystroke_accuracy(len(correct_times), wrong_keys)
+    result["wpm"], result["accuracy"] = wpm, accuracy
+    if abs(claimed_wpm - wpm) > max(0.01, wpm * VERIFY_WPM_TOLERANCE):
+        result["reason"] = "WPM does not match key events"
+        return result
+    if abs(claimed_accuracy - accuracy) > 0.01:
+        result["reason"] = "accuracy does not match key events"
+        return result
+
+    result["risk"] = float(anticheat_risk(intervals, sentence, None, wrong_keys, event_log.pair_positions())[0])
+    if result["risk"] >= ANTICHEAT_RISK_THRESHOLD:
+        result["reason"] = "machine-like input"
+        return result
+    result["valid"] = True
+    return result
+
+
+def verify_batch(batch):
+    return [verify_submission(content) for content in batch]
+
+
+def verify_submissions(submissions, workers=None, max_pending=None):
+    """
+    Verifies submitted session files in a process pool and yields the
+    verify_submission() results in submission order. Submissions go to
+    the workers in batches of VERIFY_BATCH_SIZE and at most max_pending
+    batches (default two per worker) are in flight: the submissions
+    iterable is only read as fast as the workers keep up, so a busy pool
+    holds back the producer instead of queueing without bound.
+    """
+    workers = workers or os.cpu_count()
+    max_pending = max_pending or 2 * workers
+    pending = deque()
+    with multiprocessing.Pool(workers) as pool:
+        batch = []
+        for content in submissions:
+            batch.append(content)
+            if len(batch) < VERIFY_BATCH_SIZE:
+                continue
+            if len(pending) >= max_pending:
+                yield from pending.popleft().get()
+            pending.append(pool.apply_async(verify_batch, (batch,)))
+            batch = []
+        if batch:
+            pending.append(pool.apply_async(verify_batch, (batch,)))
+        while pending:
+            yield from pending.popleft().get()
+
+
+def read_submissions(paths):
+    for path in paths:
+        with open(path, "r", encoding='utf-8') as f:
+            yield f.read()
+
+
+def verify_files(args):
+    accepted = 0
+    for path, result in zip(args.files, verify_submissions(read_submissions(args.files), args.workers)):
+        if result["valid"]:
+            accepted += 1
+            print(f"{path}: accepted (WPM {result['wpm']:.2f}, accuracy {result['accuracy']:.2f}%, "
+                  f"risk {result['risk']:.2f})")
+        else:
+            print(f"{path}: rejected, {result['reason']}")
+    print(f"{accepted} of {len(args.files)} sessions accepted")
+
+
+def submission_content(content):
+    """
+    A saved session file made self-contained for a server, which has no
+    passage table: the passage text is put back on a Sentence line and the
+    file signed again. Only a file whose signature checks out is signed
+    again, so an edited file cannot be passed off as genuine. Files that
+    already carry their sentence come back unchanged. Returns None when
+    the signature fails or the passage is not in the local table.
+    """
+    lines = content.splitlines()
+    if not verify_session_lines(lines):
+        return None
+    if not lines[0].startswith("Schema: ") or any(line.startswith("Sentence: ") for line in lines):
+        return content
+    sentence = resolve_passage(decode_session_header(lines).get("passage"))
+    if sentence is None or "" not in lines:
+        return None
+    blank = lines.index("")
+    lines_to_sign = lines[:blank + 1] + [f"Sentence: {sentence}"]
+    lines_to_sign += [line for line in lines[blank + 1:] if not line.startswith("HMAC: ")]
+    lines_to_sign.append(f"HMAC: {compute_hmac(lines_to_sign)}")
+    return "\n".join(lines_to_sign) + "\n"
+
+
+def submit_files(args):
+    """
+    Writes a submission_content() copy of every file to args.output, under
+    the same name, ready for "verify" on a machine without this passage
+    table.
+    """
+    os.makedirs(args.output, exist_ok=True)
+    written = 0
+    for path in args.files:
+        with open(path, "r", encoding='utf-8') as f:
+            content = submission_content(f.read())
+        if content is None:
+            print(f"{path}: skipped, bad signature or passage not in {PASSAGES_FOLDER}")
+            continue
+        target = os.path.join(args.output, os.path.basename(path))
+        with open(target + ".tmp", "w", encoding='utf-8') as f:
+            f.write(content)
+        os.replace(target + ".tmp", target)
+        written += 1
+    print(f"Wrote {written} of {len(args.files)} sessions to {args.output}.")
+
+
+def simulated_submission(job):
+    """
+    One simulated session signed as a client would submit it. tamper is
+    None, "edited" (WPM changed after signing) or "inflated" (WPM changed
+    and re-signed, as a client that leaked the key would do).
+    """
+    kind, seed, text, tamper = job
+    elapsed, time_stamps, event_log, error_log = play_simulated_session(kind, seed, text)
+    wpm = calculate_wpm(len(text), elapsed)
+    accuracy = calculate_keystroke_accuracy(event_log.count(EventLog.CORRECT), event_log.count(EventLog.WRONG))
+    if tamper == "inflated":
+        wpm *= 1.5
+    content = format_session(wpm, accuracy, f"{20260101 + seed % 28}_000000", time_stamps, text, error_log, event_log,
+                             elapsed=elapsed)
+    if tamper == "edited":
+        content = content.replace("WPM: ", "WPM: 1", 1)
+    return content
+
+
+def bench_verify(args):
+    """
+    Verifies args.sessions simulated submissions (a tenth of them edited
+    after signing, a tenth re-signed with an inflated WPM) through
+    verify_submissions() and reports verifications per second per core.
+    """
+    texts = SENTENCES + [" ".join(SENTENCES)]
+    kinds = sorted(INPUT_SIMULATORS)
+    tampering = {3: "edited", 7: "inflated"}
+    jobs = [(kinds[i % len(kinds)], i, texts[(i // len(kinds)) % len(texts)], tampering.get(i % 10))
+            for i in range(args.sessions)]
+    with multiprocessing.Pool(args.workers) as pool:
+        submissions = pool.map(simulated_submission, jobs, chunksize=32)
+
+    workers = args.workers or os.cpu_count()
+    started = time.perf_counter()
+    outcomes = Counter(result["reason"] or "accepted" for result in verify_submissions(submissions, workers))
+    wall_time = time.perf_counter() - started
+
+    rate = len(submissions) / wall_time
+    print(f"Verified {len(submissions)} submissions in {wall_time:.2f}s on {workers} workers: "
+          f"{rate:.0f} per second, {rate / workers:.0f} per second per core")
+    for outcome, count in outcomes.most_common():
+        print(f"  {outcome:<36} {count}")
+
+
+def bench_signing(args):
+    """
+    Time per signature for every SIGNING_ALGORITHMS entry on simulated
+    session files, a short sentence and the long passage, to choose
+    SIGNING_ALGORITHM for the hardware the archive is verified on.
+    """
+    samples = [simulated_submission(("human", 0, text, None)) for text in (SENTENCES[0], " ".join(SENTENCES))]
+    repeats = max(1, args.sessions // 5)
+    for content in samples:
+        message = content[:content.rindex("\nHMAC: ")].encode('utf-8')
+        print(f"\n{len(message)} byte session:")
+        for algorithm, sign in SIGNING_ALGORITHMS.items():
+            started = time.perf_counter()
+            for _ in range(repeats):
+                sign(SIGNING_KEYS[SIGNING_KEY_ID], message)
+            cost = (time.perf_counter() - started) / repeats
+            print(f"  {algorithm:<8} {cost * 1e6:7.2f} us, {len(message) / cost / 1e6:7.1f} MB/s")
+
+
+def write_legacy_archive(folder, sessions, rng):
+    """
+    A stats folder as a player who went through every version would
+    have it: session files of every format, cheat files, and stats.txt
+    rows in all the layouts, for the parse benchmark.
+    """
+    key = SIGNING_KEYS[LEGACY_SIGNATURE[1]]
+    summary_rows = []
+    for i in range(sessions):
+        timestamp = f"2025{1 + i % 12:02d}{1 + i % 28:02d}_{i // 3600 % 24:02d}{i // 60 % 60:02d}{i % 60:02d}"
+        sentence = SENTENCES[i % len(SENTENCES)]
+        intervals = [rng.uniform(0.05, 0.4) for _ in sentence]
+        wpm, accuracy, avg_time = rng.uniform(30, 120), rng.uniform(80, 100), sum(intervals) / len(intervals)
+        header = [f"WPM: {wpm:.2f}", f"Accuracy: {accuracy:.2f}%", f"Timestamp: {timestamp}"]
+        timings = "Time Between Letters (s): " + ", ".join(f"{t:.3f}" for t in intervals)
+        kind = i % 6
+        if kind == 0:  # ver2-8 score file
+            lines = header + [f"Avg Time Between Letters: {avg_time:.3f} sec", timings]
+        elif kind == 1:  # ver10
+            lines = header + [f"Sentence: {sentence}", f"Avg Time Between Letters: {avg_time:.3f} sec", timings]
+        elif kind == 2:  # ver10_hashes / ver11
+            signed = header + [f"Avg Time Between Letters: {avg_time:.3f} sec", f"Sentence: {sentence}"]
+            lines = signed + [timings, f"HMAC: {hmac_sha256(key, chr(10).join(signed).encode('utf-8'))}"]
+        elif kind == 3:  # ver12
+            lines = format_session(wpm, accuracy, timestamp, intervals, sentence, prev_hash="none",
+                                   elapsed=sum(intervals)).splitlines()
+        elif kind == 4:  # ver9 cheat file
+            lines = ["CHEAT DETECTED", f"Hash: {'0' * 64}",
+                     "This session's stats are invalid due to detected macro or automated input."]
+        else:  # ver11 cheat file
+            lines = ["CHEAT DETECTED", f"Hash: {'0' * 64}",
+                     "This session's stats are invalid due to detected macro or automated input.", "HMAC: INVALID"]
+        prefix = "score" if kind == 0 else "stats"
+        with open(os.path.join(folder, f"{prefix}{timestamp}.txt"), "w", encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+
+        row = f"{timestamp}, WPM: {wpm:.2f}, Time: {sum(intervals):.2f}s, Accuracy: {accuracy:.2f}%, AvgTimeBetweenLetters: {avg_time:.3f}s"
+        if kind in (4, 5):
+            row = f"{timestamp}, CHEAT DETECTED, WPM: 0.00, Time: 0.00s, Accuracy: 0.00%, AvgTimeBetweenLetters: 0.000s"
+        if kind == 1:
+            row += f", Sentence: {sentence}, with a comma"
+        summary_rows.append(row)
+    with open(os.path.join(folder, "stats.txt"), "w", encoding='utf-8') as f:
+        f.write("\n".join(summary_rows) + "\n")
+
+
+def bench_parse(args):
+    """
+    Streams a mixed archive of args.sessions sessions (every format) plus
+    its stats.txt through iter_stats_records() and reports records/s.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        write_legacy_archive(folder, args.sessions, random.Random(0))
+        size = sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+        started = time.perf_counter()
+        formats = Counter((record.format, record.cheat, record.verified) for record in iter_stats_records([folder]))
+        wall_time = time.perf_counter() - started
+
+    total = sum(formats.values())
+    print(f"Parsed {total} records ({size / 1e6:.1f} MB) in {wall_time:.2f}s: "
+          f"{total / wall_time:.0f} records/s, {size / wall_time / 1e6:.1f} MB/s")
+    for (file_format, cheat, verified), count in sorted(formats.items(), key=str):
+        label = "cheat" if cheat else {None: "unsigned", True: "verified", False: "NOT verified"}[verified]
+        print(f"  {file_format:<14} {label:<12} {count}")
+
+
+def bench_codec(args):
+    """
+    Stores the intervals of args.sessions simulated human sessions with
+    every INTERVAL_ENCODINGS entry and reports payload bytes per key,
+    decode cost per session, one at a time and in one batch (as export
+    reads them), and bulk decode throughput of one long payload.
+    """
+    texts = SENTENCES + [" ".join(SENTENCES)]
+    sessions = []
+    for seed in range(args.sessions):
+        text = texts[seed % len(texts)]
+        times = [t for t, ch in simulate_human(text, random.Random(seed))]
+        sessions.append(np.diff(times, prepend=times[0] - 0.5))
+    keys = sum(len(intervals) for intervals in sessions)
+    everything = np.concatenate(sessions)
+
+    def best_of(repeats, function):
+        cost = float("inf")
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = function()
+            cost = min(cost, time.perf_counter() - started)
+        return cost, result
+
+    print(f"{len(sessions)} sessions, {keys} keys")
+    print(f"{'encoding':<16}{'bytes/key':>10}{'encode us':>11}{'decode us':>11}{'batched us':>12}"
+          f"{'bulk decode':>16}")
+    for name, (encode, decode, decode_batch) in INTERVAL_ENCODINGS.items():
+        encode_cost, payloads = best_of(3, lambda: [encode(intervals) for intervals in sessions])
+        decode_cost, decoded = best_of(3, lambda: [decode(payload) for payload in payloads])
+        assert all(np.allclose(a, b, atol=0.0006) for a, b in zip(sessions, decoded))
+        batch_cost, decoded = best_of(3, lambda: decode_batch(payloads))
+        assert all(np.allclose(a, b, atol=0.0006) for a, b in zip(sessions, decoded))
+
+        bulk = encode(everything)
+        bulk_cost, _ = best_of(3, lambda: decode(bulk))
+        size = sum(len(payload) for payload in payloads)
+        print(f"{name:<16}{size / keys:>10.2f}{encode_cost / len(sessions) * 1e6:>11.1f}"
+              f"{decode_cost / len(sessions) * 1e6:>11.1f}{batch_cost / len(sessions) * 1e6:>12.1f}"
+              f"{len(everything) / bulk_cost / 1e6:>10.1f} M/s")
+
+
+def session_batches(records, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Groups records into lists of at most batch_rows, so an export only
+    holds one batch of sessions in memory at a time.
+    """
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_parquet(path, batch_rows=EXPORT_BATCH_ROWS):
+    """
+    Writes every verified session to a Parquet file, one Arrow record
+    batch of batch_rows sessions at a time: the results as scalar columns
+    and the key intervals (seconds) as a list column, null for ver11
+    files, which only sign their first five lines. pyarrow is only
+    needed here, so it is imported on use. Returns the sessions written,
+    or None without pyarrow.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("Parquet export needs pyarrow: pip install pyarrow")
+        return None
+
+    schema = pa.schema([
+        ("session", pa.string()),
+        ("format", pa.string()),
+        ("time", pa.timestamp("s")),
+        ("wpm", pa.float64()),
+        ("accuracy", pa.float64()),
+        ("elapsed", pa.float64()),
+        ("avg_time", pa.float64()),
+        ("passage", pa.string()),
+        ("sentence", pa.string()),
+        ("intervals", pa.list_(pa.float64())),
+    ])
+    records = (record for record in iter_archive_records(keep_segment=lambda summary: summary["verified"] > 0,
+                                                         decode_intervals=False)
+               if record.verified)
+    written = 0
+    with pq.ParquetWriter(path + ".tmp", schema) as writer:
+        for batch in session_batches(records, batch_rows):
+            signed = [record.intervals if record.format == "ver12" else None for record in batch]
+            decoded = decode_intervals_batch(signed)
+            intervals = [values if values is not None else np.empty(0) for values in decoded]
+            offsets = np.zeros(len(batch) + 1, dtype=np.int32)
+            np.cumsum([len(values) for values in intervals], out=offsets[1:])
+            columns = [
+                [os.path.basename(record.source) for record in batch],
+                [record.format for record in batch],
+                [parse_timestamp(record.timestamp) for record in batch],
+                [record.wpm for record in batch],
+                [record.accuracy for record in batch],
+                [record.elapsed for record in batch],
+                [record.avg_time for record in batch],
+                [record.passage for record in batch],
+                [record.sentence for record in batch],
+                pa.ListArray.from_arrays(pa.array(offsets), pa.array(np.concatenate(intervals), type=pa.float64()),
+                                         mask=pa.array([values is None for values in signed])),
+            ]
+            writer.write_batch(pa.RecordBatch.from_arrays(
+                [column if isinstance(column, pa.Array) else pa.array(column, type=field.type)
+                 for column, field in zip(columns, schema)], schema=schema))
+            written += len(batch)
+    os.replace(path + ".tmp", path)
+    return written
+
+
+def write_stats(rows, out, output_format):
+    """
+    Writes rows of STATS_EXPORT_FIELDS values to out as CSV (with a header
+    row) or JSON lines, one row at a time. Returns the rows written.
+    """
+    written = 0
+    if output_format == "csv":
+        writer = csv.writer(out)
+        writer.writerow(STATS_EXPORT_FIELDS)
+        for row in rows:
+            writer.writerow("" if value is None else value for value in row)
+            written += 1
+    else:
+        for row in rows:
+            out.write(json.dumps(dict(zip(STATS_EXPORT_FIELDS, row))) + "\n")
+            written += 1
+    return written
+
+
+def query_stats(args):
+    """
+    The "stats" command: sessions matching the filters as CSV or JSON
+    lines, on stdout or in args.output.
+    """
+    passages = None
+    if args.sentence is not None:
+        # Either the passage text or its ID
+        passages = {args.sentence, passage_id(args.sentence)}
+    query = StatsQuery(since=args.since.strftime("%Y%m%d_000000") if args.since else None,
+                       until=args.until.strftime("%Y%m%d_235959") if args.until else None,
+                       passages=passages, min_wpm=args.min_wpm, exclude_flagged=args.exclude_flagged)
+    # A running stats daemon answers from memory; otherwise the archive is streamed
+    result = query_daemon("stats", {"since": query.since, "until": query.until,
+                                    "passages": sorted(passages) if passages is not None else None,
+                                    "min_wpm": query.min_wpm, "exclude_flagged": query.exclude_flagged})
+    rows = result["rows"] if result is not None else stats_rows(iter_query_records(query))
+    if args.output is None:
+        try:
+            write_stats(rows, sys.stdout, args.format)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            # The reader stopped early ("stats | head"): point stdout at devnull so the exit flush stays quiet
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            sys.exit(1)
+        return
+    with open(args.output + ".tmp", "w", encoding='utf-8', newline="") as f:
+        written = write_stats(rows, f, args.format)
+    os.replace(args.output + ".tmp", args.output)
+    print(f"Wrote {written} sessions to {args.output}.")
+
+
+def stats_fingerprint():
+    """
+    Size and modification time of the files that change whenever a
+    session is saved, stats.txt is extended or sessions are compacted.
+    Four stat calls, so it can be checked before every query.
+    """
+    fingerprint = []
+    for path in (os.path.join(STATS_FOLDER, "stats.txt"), MERKLE_INDEX_FILE, AGGREGATES_FILE, SEGMENTS_FOLDER):
+        try:
+            info = os.stat(path)
+            fingerprint.append((info.st_size, info.st_mtime_ns))
+        except OSError:
+            fingerprint.append(None)
+    return fingerprint
+
+
+def encode_series(series):
+    # Each metric as the base64 of its float64 values: a quarter of the size of JSON numbers and decoded in one call
+    return {metric: base64.b64encode(np.asarray(values, dtype=np.float64).tobytes()).decode('ascii')
+            for metric, values in series.items()}
+
+
+def decode_series(encoded):
+    return {metric: np.frombuffer(base64.b64decode(values), dtype=np.float64).tolist()
+            for metric, values in encoded.items()}
+
+
+class StatsDaemon:
+    """
+    Keeps the stats of STATS_FOLDER warm in memory for frontends: the
+    session index (every session's results, no payloads), the aggregates
+    and the plotting series and rollups. A watcher thread polls
+    stats_fingerprint() and reloads on change; new loose session files
+    are added to the index without re-reading the rest. Answers are
+    serialized once per reload, so a query costs a fingerprint check and
+    one send.
+
+    Protocol: the client sends one line, "<op>" or "<op> <JSON object>",
+    and gets one line back, {"ok": true, "result": ...} or {"ok": false,
+    "error": "..."}. Ops are in OPS; a connection may send several lines.
+    """
+
+    OPS = ("ping", "aggregates", "rollups", "series", "stats")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fingerprint = None
+        self.segments = None
+        self.loose = []
+        self.records = []
+        self.responses = {}
+        self.stopped = threading.Event()
+
+    def refresh(self):
+        # Reloads what changed since the last refresh; cheap when nothing did
+        with self.lock:
+            fingerprint = stats_fingerprint()
+            if fingerprint != self.fingerprint:
+                self.reload()
+                self.fingerprint = fingerprint
+
+    def reload(self):
+        segments, loose = archive_listing()
+        segment_paths = [path for path, _ in segments]
+        if segment_paths == self.segments and loose[:len(self.loose)] == self.loose:
+            records = list(self.records)
+            for name in loose[len(self.loose):]:
+                with open(os.path.join(STATS_FOLDER, name), "r", encoding='utf-8', errors='replace') as f:
+                    record = parse_session_lines(os.path.join(STATS_FOLDER, name), f.read().splitlines(), payload=False)
+                if record is not None:
+                    records.append(record)
+        else:
+            records = list(iter_query_records(StatsQuery()))
+
+        series = load_stats_series() or {metric: [] for metric in PLOT_METRICS}
+        responses = {
+            "aggregates": load_aggregates(),
+            "rollups": build_rollups(series),
+            "series": encode_series(series),
+        }
+        # Swapped in whole, so a query never sees half of a reload
+        self.records, self.segments, self.loose = records, segment_paths, loose
+        self.responses = {op: json.dumps({"ok": True, "result": result}, separators=(",", ":")).encode('utf-8') + b"\n"
+                          for op, result in responses.items()}
+
+    def answer(self, line):
+        op, _, args = line.strip().partition(" ")
+        if op not in self.OPS:
+            return {"ok": False, "error": f"unknown op {op!r}"}
+        self.refresh()
+        if op in self.responses:
+            return self.responses[op]
+        if op == "ping":
+            return {"ok": True, "result": {"sessions": len(self.records)}}
+        def optional(key, convert):
+            return convert(args[key]) if args.get(key) is not None else None
+
+        try:
+            args = json.loads(args) if args else {}
+            query = StatsQuery(optional("since", str), optional("until", str), optional("passages", set),
+                               optional("min_wpm", float), bool(args.get("exclude_flagged")))
+        except (ValueError, AttributeError, TypeError):
+            return {"ok": False, "error": "malformed query"}
+        rows = list(stats_rows(record for record in self.records if query_matches(query, record)))
+        return {"ok": True, "result": {"fields": STATS_EXPORT_FIELDS, "rows": rows}}
+
+    def watch(self):
+        while not self.stopped.wait(DAEMON_POLL_INTERVAL):
+            self.refresh()
+
+    def serve(self, path=DAEMON_SOCKET):
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    response = daemon.answer(line.decode('utf-8', errors='replace'))
+                    if isinstance(response, dict):
+                        response = json.dumps(response, separators=(",", ":")).encode('utf-8') + b"\n"
+                    self.wfile.write(response)
+
+        self.refresh()
+        watcher = threading.Thread(target=self.watch, daemon=True)
+        watcher.start()
+        with socketserver.ThreadingUnixStreamServer(path, Handler) as server:
+            server.daemon_threads = True
+            try:
+                server.serve_forever()
+            finally:
+                self.stopped.set()
+                os.remove(path)
+
+
+def query_daemon(op, args=None, path=DAEMON_SOCKET):
+    """
+    Result of one query to a running stats daemon, or None when no daemon
+    answers (not started, not supported here, or too slow), in which case
+    the caller reads the stats files itself.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(path):
+        return None
+    request = op if args is None else f"{op} {json.dumps(args)}"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(DAEMON_TIMEOUT)
+            sock.connect(path)
+            sock.sendall(request.encode('utf-8') + b"\n")
+            with sock.makefile("rb") as f:
+                response = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return response["result"] if response.get("ok") else None
+
+
+def serve_stats(args):
+    if not hasattr(socket, "AF_UNIX"):
+        print("The stats daemon needs Unix domain sockets, which this system does not have.")
+        return
+    if os.path.exists(args.socket):
+        if query_daemon("ping", path=args.socket) is not None:
+            print(f"A stats daemon is already listening on {args.socket}.")
+            return
+        os.remove(args.socket)  # left behind by a daemon that did not shut down cleanly
+    os.makedirs(os.path.dirname(args.socket) or ".", exist_ok=True)
+    print(f"Serving stats of {STATS_FOLDER} on {args.socket} (Ctrl-C to stop).")
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # remove the socket on kill too
+    try:
+        StatsDaemon().serve(args.socket)
+    except KeyboardInterrupt:
+        print("\nStats daemon stopped.")
+
+
+def main_menu():
+    while True:
+        print("\nKeyDash Main Menu:")
+        print("1. Start Typing Test")
+        print("2. View Performance Stats")
+        print("3. Exit")
+
+        choice = input("Enter option (1-3): ").strip()
+        if choice == "1":
+            typing_test()
+        elif choice == "2":
+            rebuild_cumulative_stats()  # Refresh stats file from verified individual stats
+            plot_stats()
+        elif choice == "3":
+            print("Goodbye!")
+            sys.exit(0)
+        else:
+            print("Invalid option, please enter 1, 2, or 3.")
+
+
+BENCHMARKS = {
+    "render": bench_render,
+    "anticheat": bench_anticheat,
+    "verify": bench_verify,
+    "signing": bench_signing,
+    "parse": bench_parse,
+    "codec": bench_codec,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="keydash", description="Offline KeyDash typing game.")
+    subparsers = parser.add_subparsers(dest="command")
+
+    bench_parser = subparsers.add_parser("bench", help="run a performance benchmark")
+    bench_parser.add_argument("target", choices=sorted(BENCHMARKS))
+    bench_parser.add_argument("--chars", type=int, default=2000, help="passage length for the render benchmark")
+    bench_parser.add_argument("--sessions", type=int, default=5000,
+                              help="simulated sessions for the anticheat, verify, signing, parse and codec benchmarks")
+    bench_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+    bench_parser.add_argument("--corpus", help="also write the simulated sessions as a JSON lines corpus")
+
+    eval_parser = subparsers.add_parser("eval-anticheat", help="evaluate anti-cheat scoring on labelled sessions")
+    eval_parser.add_argument("corpus", nargs="*", help="JSON lines files with intervals, text and label (1 = machine)")
+    eval_parser.add_argument("--include-local", action="store_true", help="add verified local sessions as human samples")
+
+    audit_parser = subparsers.add_parser("audit", help="check the session archive against its Merkle index")
+    audit_group = audit_parser.add_mutually_exclusive_group()
+    audit_group.add_argument("--root", help="root hash recorded earlier, e.g. by a server")
+    audit_group.add_argument("--against", help="another merkle.log (or older merkle.json) to compare with")
+    audit_group.add_argument("--rehash", action="store_true", help="hash the session files again and compare")
+    audit_group.add_argument("--chain", action="store_true", help="verify every session file and its link to the previous one")
+
+    compact_parser = subparsers.add_parser("compact", help="fold old session files into segment files")
+    compact_parser.add_argument("--days", type=float, default=COMPACT_AFTER_DAYS,
+                                help=f"compact sessions older than this many days (default: {COMPACT_AFTER_DAYS})")
+
+    export_parser = subparsers.add_parser("export", help="export verified sessions to a Parquet file (needs pyarrow)")
+    export_parser.add_argument("output", help="Parquet file to write")
+    export_parser.add_argument("--batch-rows", type=int, default=EXPORT_BATCH_ROWS,
+                               help=f"sessions per record batch (default: {EXPORT_BATCH_ROWS})")
+
+    stats_parser = subparsers.add_parser("stats", help="list sessions matching filters as CSV or JSON lines")
+    stats_parser.add_argument("--since", type=datetime.date.fromisoformat, help="first day, YYYY-MM-DD")
+    stats_parser.add_argument("--until", type=datetime.date.fromisoformat, help="last day, YYYY-MM-DD")
+    stats_parser.add_argument("--sentence", help="only sessions of this passage (its text or passage ID)")
+    stats_parser.add_argument("--min-wpm", type=float, help="only sessions at least this fast")
+    stats_parser.add_argument("--exclude-flagged", action="store_true",
+                              help="leave out cheat sessions and sessions that fail verification")
+    stats_parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    stats_parser.add_argument("--output", help="file to write (default: standard output)")
+
+    serve_parser = subparsers.add_parser("serve", help="run the stats query daemon on a Unix domain socket")
+    serve_parser.add_argument("--socket", default=DAEMON_SOCKET, help=f"socket path (default: {DAEMON_SOCKET})")
+
+    verify_parser = subparsers.add_parser("verify", help="verify submitted session files as a server would")
+    verify_parser.add_argument("files", nargs="+", help="session files written by format_session() or \"submit\"")
+    verify_parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per CPU)")
+
+    submit_parser = subparsers.add_parser("submit", help="write self-contained copies of session files to submit")
+    submit_parser.add_argument("files", nargs="+", help="session files written by save_score()")
+    submit_parser.add_argument("--output", default=SUBMISSIONS_FOLDER,
+                               help=f"folder to write them to (default: {SUBMISSIONS_FOLDER})")
+
+    args = parser.parse_args(argv)
+    if args.command == "bench":
+        BENCHMARKS[args.target](args)
+    elif args.command == "eval-anticheat":
+        print_anticheat_report(evaluate_anticheat(load_anticheat_corpus(args.corpus, args.include_local)))
+    elif args.command == "verify":
+        verify_files(args)
+    elif args.command == "submit":
+        submit_files(args)
+    elif args.command == "audit":
+        audit_archive(args)
+    elif args.command == "stats":
+        query_stats(args)
+    elif args.command == "serve":
+        serve_stats(args)
+    elif args.command == "export":
+        written = export_parquet(args.output, args.batch_rows)
+        if written is not None:
+            print(f"Exported {written} sessions to {args.output}.")
+    elif args.command == "compact":
+        compacted = compact_archive(args.days)
+        print(f"Compacted {compacted} sessions into {SEGMENTS_FOLDER}.")
+    else:
+        main_menu()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nTyping test interrupted.")